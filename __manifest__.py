@@ -4,10 +4,12 @@
     'summary': 'Paie vendeurs basée sur les commandes BP existantes (sans modèles persistants)',
     'author': 'Votre Nom',
     'category': 'Point of Sale',
-    'depends': ['base', 'pos_caisse'],
+    'depends': ['base', 'bus', 'pos_caisse'],
+    'external_dependencies': {'python': ['numpy']},
     "data": [
         "security/ir.model.access.csv",
         "security/pos_paie_security.xml",
+        "data/pos_paie_cron.xml",
         "views/pos_paie_menu.xml",
         "views/pos_paie_views.xml",
         "reports/pos_paie_periode_ligne_report.xml",
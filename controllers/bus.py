@@ -0,0 +1,17 @@
+from odoo.http import request
+from odoo.addons.bus.controllers.main import BusController
+
+
+class PosPaieBusController(BusController):
+
+    def _poll(self, dbname, channels, last, options):
+        # Canal privé des deltas de paie: ajouté côté serveur pour les seuls
+        # utilisateurs paie (un client ne peut nommer qu'un canal texte, public)
+        if request.session.uid:
+            user = request.env.user
+            if user.has_group('pos_paie.group_pos_paie_manager') or user.has_group('pos_paie.group_pos_paie_user'):
+                channel = request.env['pos.caisse.commande']._paie_bus_channel()
+                if channel:
+                    channels = list(channels)
+                    channels.append(channel)
+        return super()._poll(dbname, channels, last, options)
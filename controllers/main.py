@@ -1,15 +1,199 @@
-from odoo import http, fields
+from odoo import http, fields, api, sql_db
 from odoo.http import request
+from odoo.exceptions import ValidationError
 from datetime import datetime
 from collections import defaultdict
+from contextlib import contextmanager
+import logging
+import psycopg2
+
+from odoo.addons.bus.models.bus import channel_with_db, json_dump
+
+from ..models.pos_caisse_commande import PAIE_BUS_TYPE
+from ..tools.calcul import calculer_commissions
 
 class PosPaieApi(http.Controller):
-    @http.route(['/api/pos_paie/vendeurs'], type='json', auth='user', methods=['GET', 'POST'], csrf=False)
-    def get_vendeurs(self, **payload):
-        # Accept both plain JSON and JSON-RPC envelope
-        params = http.request.jsonrequest or payload or {}
+    # Sous-appels autorisés par /api/pos_paie/batch -> méthode du contrôleur
+    BATCH_METHODS = {
+        'vendeurs': 'get_vendeurs',
+        'calculer': 'calculer_paie',
+        'rapport': 'rapport',
+        'totaux': 'totaux_legacy',
+        'periode/create': 'create_periode',
+        'periodes': 'list_periodes',
+        'periode/lookup': 'lookup_periode',
+        'payer_commandes': 'payer_commandes',
+        'abonnement': 'abonnement',
+    }
+
+    def _get_params(self, payload):
+        # Accept both plain JSON and JSON-RPC envelope; a batch sub-call carries its own params
+        if getattr(request, 'pos_paie_batch', None) is not None:
+            params = payload or {}
+        else:
+            params = http.request.jsonrequest or payload or {}
         if isinstance(params, dict) and 'params' in params and isinstance(params.get('params'), dict):
             params = params['params']
+        return params
+
+    def _single_flight(self, endpoint, params, compute):
+        # Dans un batch, les sous-appels partagent déjà leurs agrégats (et peuvent suivre une écriture)
+        if getattr(request, 'pos_paie_batch', None) is not None:
+            return compute()
+        return request.env['pos.paie.calcul.cache'].sudo()._single_flight(endpoint, params, compute)
+
+    @contextmanager
+    def _read_env(self):
+        """Environnement pour les lectures seules (rapports/API).
+
+        Si ``pos_paie.replica_db`` (nom de base ou URI postgresql://) est défini,
+        les lectures passent par un curseur en lecture seule sur cette base,
+        sauf si son retard de réplication dépasse ``pos_paie.replica_max_lag``
+        secondes (défaut 5): on retombe alors sur la base primaire. Un batch
+        reste sur la primaire pour voir ses propres écritures.
+
+        Les caches partagés par le registre (index des vendeurs en ormcache,
+        paramètres ir.config_parameter) ne doivent pas être remplis depuis cet
+        environnement: une réplique en retard y figerait des données périmées
+        jusqu'à la prochaine invalidation. Ces lectures passent par
+        ``request.env`` (voir ``_vendeurs_totaux``). Une réplique de même nom de
+        base partage le registre du worker; une base de nom différent (p.ex.
+        seconde base locale pour les essais) charge son propre registre
+        complet dans chaque worker HTTP au premier appel et doit avoir
+        pos_paie installé.
+        """
+        ICP = request.env['ir.config_parameter'].sudo()
+        target = ICP.get_param('pos_paie.replica_db')
+        cr = None
+        if target and getattr(request, 'pos_paie_batch', None) is None:
+            max_lag = float(ICP.get_param('pos_paie.replica_max_lag', 5))
+            try:
+                cr = sql_db.db_connect(target, allow_uri=True).cursor()
+                cr.execute("SET TRANSACTION READ ONLY")
+                lag = self._replica_lag(cr)
+                if lag is None or lag > max_lag:
+                    logging.warning("pos_paie: réplique %s en retard (%s s), lecture sur la primaire", cr.dbname, lag)
+                    cr.close()
+                    cr = None
+            except Exception:
+                logging.exception("pos_paie: réplique %s indisponible, lecture sur la primaire", target)
+                if cr is not None:
+                    cr.close()
+                cr = None
+        if cr is None:
+            yield request.env
+            return
+        try:
+            yield api.Environment(cr, request.env.uid, request.env.context)
+        finally:
+            cr.close()
+
+    def _frais_carte(self):
+        # Lu sur la primaire (ormcache de ir.config_parameter), jamais via la réplique
+        return request.env['pos.paie.periode'].sudo()._frais_carte()
+
+    def _replica_lag(self, cr):
+        # Retard en secondes (0 si la base n'est pas une réplique ou a rejoué tout le WAL reçu)
+        cr.execute("""
+            SELECT CASE
+                WHEN NOT pg_is_in_recovery() THEN 0
+                WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+            END
+        """)
+        lag = cr.fetchone()[0]
+        return float(lag) if lag is not None else None
+
+    def _commandes_cartes(self, env, cards, start_dt, end_dt):
+        """Commandes non payées de la période pour ``cards``, groupées par carte.
+
+        Dans un batch, le résultat est mémorisé par période: les sous-appels
+        partageant la période réutilisent une seule recherche (préchargée par
+        ``_batch_prefetch`` pour toutes leurs cartes).
+        """
+        Cmd = env['pos.caisse.commande'].sudo()
+        batch = getattr(request, 'pos_paie_batch', None)
+        key = ('commandes', start_dt, end_dt)
+        cached = batch.get(key, {}) if batch is not None else {}
+        missing = [card for card in cards if card not in cached]
+        if missing:
+            domain = [
+                ('client_card', 'in', missing),
+                ('state', '!=', 'annule'),
+                ('paiement_state', '=', 'non_payee'),  # Ne prendre que les commandes non payées
+                ('date', '>=', fields.Datetime.to_string(start_dt)),
+                ('date', '<=', fields.Datetime.to_string(end_dt)),
+            ]
+            commandes = Cmd.search(domain)
+            ids_by_card = defaultdict(list)
+            for c in commandes:
+                ids_by_card[c.client_card].append(c.id)
+            for card in missing:
+                cached[card] = Cmd.browse(ids_by_card.get(card, []))
+            if batch is not None:
+                batch[key] = cached
+        return {card: cached[card] for card in cards}
+
+    def _batch_prefetch(self, calls):
+        # Une seule recherche de commandes par période pour tous les calculer/rapport du batch
+        cards_by_period = defaultdict(set)
+        for call in calls:
+            if not isinstance(call, dict) or call.get('method') not in ('calculer', 'rapport'):
+                continue
+            sub = call.get('params') or {}
+            if not (sub.get('vendeur_card') and sub.get('date_debut') and sub.get('date_fin')):
+                continue
+            try:
+                start_dt = datetime.combine(fields.Date.from_string(sub['date_debut']), datetime.min.time())
+                end_dt = datetime.combine(fields.Date.from_string(sub['date_fin']), datetime.max.time())
+            except Exception:
+                continue
+            cards_by_period[(start_dt, end_dt)].add(sub['vendeur_card'])
+        for (start_dt, end_dt), cards in cards_by_period.items():
+            if len(cards) > 1:
+                self._commandes_cartes(request.env, list(cards), start_dt, end_dt)
+
+    def _batch_call(self, call):
+        if not isinstance(call, dict) or call.get('method') not in self.BATCH_METHODS:
+            return {'status': 'error', 'message': 'méthode inconnue'}
+        sub_params = call.get('params') or {}
+        if not isinstance(sub_params, dict):
+            return {'status': 'error', 'message': 'params invalides'}
+        method = getattr(self, self.BATCH_METHODS[call['method']])
+        try:
+            # Un sous-appel en échec n'annule pas les autres
+            with request.env.cr.savepoint():
+                return method(**sub_params)
+        except Exception as e:
+            logging.exception("Erreur dans batch (%s)", call.get('method'))
+            return {'status': 'error', 'message': str(e)}
+        finally:
+            # Les agrégats partagés ne sont plus valides après une écriture
+            if call['method'] in ('periode/create', 'payer_commandes'):
+                request.pos_paie_batch.clear()
+
+    @http.route('/api/pos_paie/batch', type='json', auth='user', methods=['POST'], csrf=False)
+    def batch(self, **payload):
+        """Exécute une liste de sous-appels pos_paie dans une seule requête/transaction.
+
+        params: {'calls': [{'method': 'vendeurs', 'params': {...}}, ...]}
+        Retourne les résultats dans l'ordre des appels.
+        """
+        params = self._get_params(payload)
+        calls = params.get('calls') if isinstance(params, dict) else None
+        if not isinstance(calls, list):
+            return {'status': 'error', 'message': 'calls requis (liste de sous-appels)'}
+        request.pos_paie_batch = {}
+        try:
+            self._batch_prefetch(calls)
+            results = [self._batch_call(call) for call in calls]
+        finally:
+            request.pos_paie_batch = None
+        return {'status': 'success', 'results': results}
+
+    @http.route(['/api/pos_paie/vendeurs'], type='json', auth='user', methods=['GET', 'POST'], csrf=False)
+    def get_vendeurs(self, **payload):
+        params = self._get_params(payload)
         # Optional period and totals
         date_debut = params.get('date_debut')
         date_fin = params.get('date_fin')
@@ -23,136 +207,147 @@ class PosPaieApi(http.Controller):
             except Exception:
                 return {'status': 'error', 'message': 'pourcentage invalide'}
 
-        import logging
-        result = []
+        # Les requêtes identiques simultanées partagent un seul calcul
+        result = self._single_flight('vendeurs', {
+            'date_debut': date_debut,
+            'date_fin': date_fin,
+            'limit': limit,
+            'with_totaux': with_totaux,
+            'pourcentage': pourcentage,
+        }, lambda: self._liste_vendeurs(date_debut, date_fin, limit, with_totaux, pourcentage))
 
-        # Si une période est spécifiée, on utilise la méthode basée sur les commandes groupées par carte
-        if date_debut and date_fin and with_totaux:
-            start_dt = datetime.combine(fields.Date.from_string(date_debut), datetime.min.time())
-            end_dt = datetime.combine(fields.Date.from_string(date_fin), datetime.max.time())
-            
-            Cmd = request.env['pos.caisse.commande'].sudo()
-            Vendor = request.env['pos.caisse.vendeur'].sudo()
-            
-            # Récupérer toutes les commandes de la période
-            domain = [
-                ('state', '!=', 'annule'),
-                ('paiement_state', '=', 'non_payee'),
-                ('date', '>=', fields.Datetime.to_string(start_dt)),
-                ('date', '<=', fields.Datetime.to_string(end_dt)),
-            ]
-            commandes = Cmd.search(domain)
-            logging.info("=================== Commandes trouvées pour la période: %s", len(commandes))
-            
-            # Grouper par carte
-            cards = set(c.client_card for c in commandes if getattr(c, 'client_card', False))
-            logging.info("=================== Cartes uniques trouvées: %s", len(cards))
-            
-            # Récupérer les vendeurs correspondants
-            vendeurs = Vendor.search([('carte_numero', 'in', list(cards))]) if cards else Vendor.browse([])
-            vend_by_card = {v.carte_numero: v for v in vendeurs}
-            
-            # Agréger par carte
-            by_card = {}
-            for c in commandes:
-                card = getattr(c, 'client_card', False)
-                if not card:
-                    continue
-                agg = by_card.setdefault(card, {'nb': 0, 'total': 0.0, 'total_bp': 0.0})
-                agg['nb'] += 1
-                agg['total'] += c.total
-                if getattr(c, 'type_paiement', False) == 'bp':
-                    agg['total_bp'] += c.total
-            
-            # Créer les entrées
-            for card, vals in by_card.items():
-                v = vend_by_card.get(card)
-                if not v:
-                    continue
-                
-                commission = vals['total'] * (pourcentage or 0.0)
-                montant_net = commission - vals['total_bp'] - 500  # Déduction de 500 FC pour la carte
-                
-                result.append({
-                    'id': v.id,
-                    'name': v.display_name,
-                    'carte_numero': v.carte_numero,
-                    'total_bp': int(vals['total_bp']),
-                    'nb_commandes': vals['nb'],
-                    'total_commandes': int(vals['total']),
-                    'commission': int(commission),
-                    'montant_net': int(montant_net),
-                })
-            
-            logging.info("=================== Vendeurs avec des commandes: %s", len(result))
-        else:
-            # Méthode legacy : récupérer tous les vendeurs
-            Vendor = request.env['pos.caisse.vendeur'].sudo()
-            vendors = Vendor.search([], limit=limit)
-            logging.info("=================== Vendeurs trouvés: %s", len(vendors))
+        # Odoo will wrap this into a JSON-RPC response automatically (type='json')
+        return {
+            'status': 'success',
+            'vendeurs': result,
+            'date_debut': date_debut,
+            'date_fin': date_fin,
+        }
 
-            start_dt = end_dt = None
-            if date_debut:
-                start_dt = datetime.combine(fields.Date.from_string(date_debut), datetime.min.time())
-            if date_fin:
-                end_dt = datetime.combine(fields.Date.from_string(date_fin), datetime.max.time())
+    def _liste_vendeurs(self, date_debut, date_fin, limit, with_totaux, pourcentage):
+        result = []
+        with self._read_env() as env:
+            # Si une période est spécifiée, on utilise la méthode basée sur les commandes groupées par carte
+            if date_debut and date_fin and with_totaux:
+                result = self._vendeurs_totaux(env, date_debut, date_fin, pourcentage)
+            else:
+                # Méthode legacy : récupérer tous les vendeurs
+                Vendor = env['pos.caisse.vendeur'].sudo()
+                vendors = Vendor.search([], limit=limit)
+                logging.info("=================== Vendeurs trouvés: %s", len(vendors))
 
-            Cmd = request.env['pos.caisse.commande'].sudo()
-            for v in vendors:
-                # Always compute BP-only aggregates for compatibility
-                domain_bp = [
-                    ('client_card', '=', v.carte_numero), 
-                    ('type_paiement', '=', 'bp'), 
-                    ('state', '!=', 'annule'),
-                    ('paiement_state', '=', 'non_payee')  # Ne prendre que les commandes non payées
-                ]
-                if start_dt:
-                    domain_bp.append(('date', '>=', fields.Datetime.to_string(start_dt)))
-                if end_dt:
-                    domain_bp.append(('date', '<=', fields.Datetime.to_string(end_dt)))
-                cmds_bp = Cmd.search(domain_bp)
-                total_bp = sum(cmds_bp.mapped('total')) if cmds_bp else 0.0
-                entry = {
-                    'id': v.id,
-                    'name': v.display_name,
-                    'carte_numero': v.carte_numero,
-                    'total_bp': int(total_bp),
-                    'nb_commandes': len(cmds_bp),
-                }
-                if with_totaux:
-                    domain_all = [
+                start_dt = end_dt = None
+                if date_debut:
+                    start_dt = datetime.combine(fields.Date.from_string(date_debut), datetime.min.time())
+                if date_fin:
+                    end_dt = datetime.combine(fields.Date.from_string(date_fin), datetime.max.time())
+
+                Cmd = env['pos.caisse.commande'].sudo()
+                totaux, totaux_bp, frais = [], [], []
+                frais_carte = self._frais_carte() if with_totaux else 0.0
+                for v in vendors:
+                    # Always compute BP-only aggregates for compatibility
+                    domain_bp = [
                         ('client_card', '=', v.carte_numero), 
+                        ('type_paiement', '=', 'bp'), 
                         ('state', '!=', 'annule'),
                         ('paiement_state', '=', 'non_payee')  # Ne prendre que les commandes non payées
                     ]
                     if start_dt:
-                        domain_all.append(('date', '>=', fields.Datetime.to_string(start_dt)))
+                        domain_bp.append(('date', '>=', fields.Datetime.to_string(start_dt)))
                     if end_dt:
-                        domain_all.append(('date', '<=', fields.Datetime.to_string(end_dt)))
-                    cmds_all = Cmd.search(domain_all)
-                    total_all = sum(cmds_all.mapped('total')) if cmds_all else 0.0
-                    commission = total_all * (pourcentage or 0.0)
-                    montant_net = commission - total_bp
-                    entry.update({
-                        'total_commandes': int(total_all),
-                        'commission': int(commission),
-                        'montant_net': int(montant_net),
-                    })
-                result.append(entry)
+                        domain_bp.append(('date', '<=', fields.Datetime.to_string(end_dt)))
+                    cmds_bp = Cmd.search(domain_bp)
+                    total_bp = sum(cmds_bp.mapped('total')) if cmds_bp else 0.0
+                    entry = {
+                        'id': v.id,
+                        'name': v.display_name,
+                        'carte_numero': v.carte_numero,
+                        'total_bp': int(total_bp),
+                        'nb_commandes': len(cmds_bp),
+                    }
+                    if with_totaux:
+                        domain_all = [
+                            ('client_card', '=', v.carte_numero), 
+                            ('state', '!=', 'annule'),
+                            ('paiement_state', '=', 'non_payee')  # Ne prendre que les commandes non payées
+                        ]
+                        if start_dt:
+                            domain_all.append(('date', '>=', fields.Datetime.to_string(start_dt)))
+                        if end_dt:
+                            domain_all.append(('date', '<=', fields.Datetime.to_string(end_dt)))
+                        cmds_all = Cmd.search(domain_all)
+                        total_all = sum(cmds_all.mapped('total')) if cmds_all else 0.0
+                        totaux.append(total_all)
+                        totaux_bp.append(total_bp)
+                        frais.append(frais_carte if cmds_all else 0.0)
+                        entry['total_commandes'] = int(total_all)
+                    result.append(entry)
+                if with_totaux and result:
+                    commissions, nets = calculer_commissions(totaux, totaux_bp, pourcentage or 0.0, frais_carte=frais)
+                    for entry, commission, frais_vendeur, montant_net in zip(result, commissions, frais, nets):
+                        entry.update({
+                            'commission': int(commission),
+                            'frais_carte': int(frais_vendeur),
+                            'montant_net': int(montant_net),
+                        })
+        return result
 
-        # Odoo will wrap this into a JSON-RPC response automatically (type='json')
-        return {
-            'status': 'success',
-            'vendeurs': result,
-            'date_debut': date_debut,
-            'date_fin': date_fin,
-        }
+    def _vendeurs_totaux(self, env, date_debut, date_fin, pourcentage):
+        """Totaux par vendeur (cartes ayant des commandes non payées) sur la période."""
+        batch = getattr(request, 'pos_paie_batch', None)
+        key = ('vendeurs', date_debut, date_fin, pourcentage)
+        if batch is not None and key in batch:
+            return batch[key]
+        # Index vendeurs et paramètres (ormcache) lus sur la primaire, jamais via la réplique
+        Vendor = request.env['pos.caisse.vendeur'].sudo()
+        batch_size = int(request.env['ir.config_parameter'].sudo().get_param('pos_paie.stream_batch_size', 2000))
+
+        # Agréger par carte les commandes de la période (curseur serveur, mémoire bornée)
+        by_card = env['pos.paie.periode'].sudo()._agreger_commandes_stream(
+            fields.Date.from_string(date_debut), fields.Date.from_string(date_fin), batch_size=batch_size,
+        )
+        logging.info("=================== Commandes trouvées pour la période: %s", sum(vals['nb'] for vals in by_card.values()))
+        logging.info("=================== Cartes uniques trouvées: %s", len(by_card))
+
+        # Récupérer les vendeurs correspondants (index carte -> vendeur en cache)
+        vend_by_card = Vendor._resoudre_cartes(by_card)
+
+        # Commission / net de toutes les cartes en un seul calcul (déduction des frais de carte)
+        cards = [card for card in by_card if card in vend_by_card]
+        frais_carte = self._frais_carte()
+        commissions, nets = calculer_commissions(
+            [by_card[card]['total'] for card in cards],
+            [by_card[card]['total_bp'] for card in cards],
+            pourcentage or 0.0,
+            frais_carte=frais_carte,
+        )
+
+        # Créer les entrées
+        result = []
+        for card, commission, montant_net in zip(cards, commissions, nets):
+            v = vend_by_card[card]
+            vals = by_card[card]
+            result.append({
+                'id': v.id,
+                'name': v.name,
+                'carte_numero': card,
+                'total_bp': int(vals['total_bp']),
+                'nb_commandes': vals['nb'],
+                'total_commandes': int(vals['total']),
+                'commission': int(commission),
+                'frais_carte': int(frais_carte),
+                'montant_net': int(montant_net),
+            })
+        
+        logging.info("=================== Vendeurs avec des commandes: %s", len(result))
+        if batch is not None:
+            batch[key] = result
+        return result
 
     @http.route('/api/pos_paie/calculer', type='json', auth='user', methods=['POST'], csrf=False)
     def calculer_paie(self, **payload):
-        params = http.request.jsonrequest or payload or {}
-        if isinstance(params, dict) and 'params' in params and isinstance(params.get('params'), dict):
-            params = params['params']
+        params = self._get_params(payload)
         vendeur_card = params.get('vendeur_card')
         date_debut = params.get('date_debut')
         date_fin = params.get('date_fin')
@@ -170,90 +365,101 @@ class PosPaieApi(http.Controller):
             end_dt = datetime.combine(fields.Date.from_string(date_fin), datetime.max.time())
         except Exception:
             return {'status': 'error', 'message': 'Format de date invalide (YYYY-MM-DD attendu)'}
-        Cmd = request.env['pos.caisse.commande'].sudo()
-        domain_all = [
-            ('client_card', '=', vendeur_card),
-            ('state', '!=', 'annule'),
-            ('paiement_state', '=', 'non_payee'),  # Ne prendre que les commandes non payées
-            ('date', '>=', fields.Datetime.to_string(start_dt)),
-            ('date', '<=', fields.Datetime.to_string(end_dt)),
-        ]
-        commandes = Cmd.search(domain_all)
-        total_all = sum(commandes.mapped('total')) if commandes else 0.0
-        total_bp = sum(c.total for c in commandes if getattr(c, 'type_paiement', False) == 'bp') if commandes else 0.0
-        commission = total_all * (pourcentage or 0.0)
-        montant_net = commission - total_bp
-        # Prepare commandes list
-        commandes_out = [{
-            'id': c.id,
-            'name': c.name,
-            'date': fields.Date.to_date(c.date).isoformat() if c.date else None,
-            'total': int(c.total),
-            'type_paiement': c.type_paiement,
-        } for c in commandes]
-        # Breakdown by day
-        daily = defaultdict(lambda: {'total': 0.0, 'total_bp': 0.0, 'nb': 0})
-        for c in commandes:
-            d = fields.Date.to_date(c.date).isoformat() if c.date else None
-            if not d:
-                continue
-            daily[d]['total'] += c.total
-            daily[d]['nb'] += 1
-            if c.type_paiement == 'bp':
-                daily[d]['total_bp'] += c.total
-        breakdown_jour = [
-            {'date': d, 'total': int(vals['total']), 'total_bp': int(vals['total_bp']), 'nb': vals['nb']}
-            for d, vals in sorted(daily.items())
-        ]
-        return {
-            'status': 'success',
+        return self._single_flight('calculer', {
             'vendeur_card': vendeur_card,
             'date_debut': date_debut,
             'date_fin': date_fin,
             'pourcentage': pourcentage,
-            'total_commandes': int(total_all),
-            'total_bp': int(total_bp),
-            'commission': int(commission),
-            'montant_net': int(montant_net),
-            'commandes': commandes_out,
-            'breakdown_jour': breakdown_jour,
-        }
+        }, lambda: self._calculer(vendeur_card, date_debut, date_fin, pourcentage, start_dt, end_dt))
+
+    def _calculer(self, vendeur_card, date_debut, date_fin, pourcentage, start_dt, end_dt):
+        with self._read_env() as env:
+            commandes = self._commandes_cartes(env, [vendeur_card], start_dt, end_dt).get(vendeur_card)
+            total_all = sum(commandes.mapped('total')) if commandes else 0.0
+            total_bp = sum(c.total for c in commandes if getattr(c, 'type_paiement', False) == 'bp') if commandes else 0.0
+            # Même calcul que la ligne de période: frais de carte déduits si la carte a des commandes
+            frais_carte = self._frais_carte() if commandes else 0.0
+            commissions, nets = calculer_commissions([total_all], [total_bp], pourcentage or 0.0, frais_carte=frais_carte)
+            commission, montant_net = commissions[0], nets[0]
+            # Prepare commandes list
+            commandes_out = [{
+                'id': c.id,
+                'name': c.name,
+                'date': fields.Date.to_date(c.date).isoformat() if c.date else None,
+                'total': int(c.total),
+                'type_paiement': c.type_paiement,
+            } for c in commandes]
+            # Breakdown by day
+            daily = defaultdict(lambda: {'total': 0.0, 'total_bp': 0.0, 'nb': 0})
+            for c in commandes:
+                d = fields.Date.to_date(c.date).isoformat() if c.date else None
+                if not d:
+                    continue
+                daily[d]['total'] += c.total
+                daily[d]['nb'] += 1
+                if c.type_paiement == 'bp':
+                    daily[d]['total_bp'] += c.total
+            breakdown_jour = [
+                {'date': d, 'total': int(vals['total']), 'total_bp': int(vals['total_bp']), 'nb': vals['nb']}
+                for d, vals in sorted(daily.items())
+            ]
+            return {
+                'status': 'success',
+                'vendeur_card': vendeur_card,
+                'date_debut': date_debut,
+                'date_fin': date_fin,
+                'pourcentage': pourcentage,
+                'total_commandes': int(total_all),
+                'total_bp': int(total_bp),
+                'commission': int(commission),
+                'frais_carte': int(frais_carte),
+                'montant_net': int(montant_net),
+                'commandes': commandes_out,
+                'breakdown_jour': breakdown_jour,
+            }
 
     @http.route('/api/pos_paie/rapport', type='json', auth='user', methods=['POST'], csrf=False)
     def rapport(self, **payload):
         # Alias de calculer avec retour allégé (sans commandes), adapté aux tableaux de bord
-        params = http.request.jsonrequest or payload or {}
-        if isinstance(params, dict) and 'params' in params and isinstance(params.get('params'), dict):
-            params = params['params']
+        params = self._get_params(payload)
         res = self.calculer_paie(**params)
         if res.get('status') != 'success':
             return res
-        keys = ['vendeur_card', 'date_debut', 'date_fin', 'pourcentage', 'total_commandes', 'total_bp', 'commission', 'montant_net', 'breakdown_jour']
+        keys = ['vendeur_card', 'date_debut', 'date_fin', 'pourcentage', 'total_commandes', 'total_bp', 'commission', 'frais_carte', 'montant_net', 'breakdown_jour']
         return {k: res[k] for k in keys if k in res} | {'status': 'success'}
 
     @http.route('/api/pos_paie/totaux', type='json', auth='user', methods=['GET'], csrf=False)
     def totaux_legacy(self, **kwargs):
         # Legacy shape for compatibility: list of vendeurs with aggregated amounts
-        pourcentage = 0.25
-        Vendor = request.env['pos.caisse.vendeur'].sudo()
-        Cmd = request.env['pos.caisse.commande'].sudo()
-        vendeurs = []
-        for v in Vendor.search([]):
-            domain = [('client_card', '=', v.carte_numero), ('state', '!=', 'annule')]
-            cmds = Cmd.search(domain)
-            total_all = sum(cmds.mapped('total')) if cmds else 0.0
-            total_bp = sum(c.total for c in cmds if getattr(c, 'type_paiement', False) == 'bp') if cmds else 0.0
-            commission = total_all * pourcentage
-            net = commission - total_bp
-            vendeurs.append({
-                'numero_carte': v.carte_numero,
-                'nom': v.display_name,
-                'total_commandes_fc': int(total_all),
-                'retenue_fc': int(commission),
-                'a_payer_fc': int(net),
-            })
+        vendeurs = self._single_flight('totaux', {}, self._totaux_legacy)
         return {'status': 'success', 'vendeurs': vendeurs}
 
+    def _totaux_legacy(self):
+        pourcentage = 0.25
+        with self._read_env() as env:
+            Vendor = env['pos.caisse.vendeur'].sudo()
+            Cmd = env['pos.caisse.commande'].sudo()
+            vendeurs = []
+            totaux, totaux_bp = [], []
+            for v in Vendor.search([]):
+                domain = [('client_card', '=', v.carte_numero), ('state', '!=', 'annule')]
+                cmds = Cmd.search(domain)
+                total_all = sum(cmds.mapped('total')) if cmds else 0.0
+                total_bp = sum(c.total for c in cmds if getattr(c, 'type_paiement', False) == 'bp') if cmds else 0.0
+                totaux.append(total_all)
+                totaux_bp.append(total_bp)
+                vendeurs.append({
+                    'numero_carte': v.carte_numero,
+                    'nom': v.display_name,
+                    'total_commandes_fc': int(total_all),
+                })
+            # Forme et montants legacy inchangés: historique complet, sans frais de carte (par période)
+            commissions, nets = calculer_commissions(totaux, totaux_bp, pourcentage)
+            for entry, commission, net in zip(vendeurs, commissions, nets):
+                entry['retenue_fc'] = int(commission)
+                entry['a_payer_fc'] = int(net)
+        return vendeurs
+
     @http.route('/api/pos_paie/payer/<string:numeroCarte>', type='json', auth='user', methods=['POST'], csrf=False)
     def payer_vendeur(self, numeroCarte, **payload):
         # Minimal stub: mark as acknowledged. Could be extended to create a sortie de caisse.
@@ -267,9 +473,7 @@ class PosPaieApi(http.Controller):
         user = request.env.user
         if not (user.has_group('pos_paie.group_pos_paie_manager') or user.has_group('pos_paie.group_pos_paie_user')):
             return {'status': 'error', 'message': "Accès refusé"}
-        params = http.request.jsonrequest or payload or {}
-        if isinstance(params, dict) and 'params' in params and isinstance(params.get('params'), dict):
-            params = params['params']
+        params = self._get_params(payload)
         date_debut = params.get('date_debut')
         date_fin = params.get('date_fin')
         name = params.get('name')
@@ -283,11 +487,18 @@ class PosPaieApi(http.Controller):
         if not name:
             name = f"Paie {date_debut} → {date_fin}"
         Per = request.env['pos.paie.periode'].sudo()
-        periode = Per.create({
-            'name': name,
-            'date_debut': dd,
-            'date_fin': df,
-        })
+        try:
+            # Savepoint: une création concurrente qui viole la contrainte d'exclusion n'annule pas la requête
+            with request.env.cr.savepoint():
+                periode = Per.create({
+                    'name': name,
+                    'date_debut': dd,
+                    'date_fin': df,
+                })
+        except ValidationError as e:
+            return {'status': 'error', 'message': str(e)}
+        except psycopg2.IntegrityError:
+            return {'status': 'error', 'message': "La période chevauche une période existante."}
         # Recompute aggregate lines
         periode.action_recompute()
         # Compute totals (cast to int FC for client)
@@ -308,37 +519,68 @@ class PosPaieApi(http.Controller):
             'montant_net_total': int(montant_net_total),
         }
 
+    @http.route('/api/pos_paie/periode/lookup', type='json', auth='user', methods=['GET', 'POST'], csrf=False)
+    def lookup_periode(self, **payload):
+        """Période (non annulée) contenant une date ou une commande."""
+        params = self._get_params(payload)
+        day = params.get('date')
+        commande_id = params.get('commande_id')
+        if not (day or commande_id):
+            return {'status': 'error', 'message': 'date ou commande_id requis'}
+        with self._read_env() as env:
+            Per = env['pos.paie.periode'].sudo()
+            if commande_id:
+                try:
+                    commande = env['pos.caisse.commande'].sudo().browse(int(commande_id)).exists()
+                except (TypeError, ValueError):
+                    return {'status': 'error', 'message': 'commande_id invalide'}
+                if not commande:
+                    return {'status': 'error', 'message': 'Commande introuvable'}
+                periode = Per._periode_pour_commande(commande)
+            else:
+                try:
+                    periode = Per._periode_pour_date(fields.Date.from_string(day))
+                except Exception:
+                    return {'status': 'error', 'message': 'Format de date invalide (YYYY-MM-DD attendu)'}
+            data = {
+                'id': periode.id,
+                'name': periode.name,
+                'date_debut': fields.Date.to_string(periode.date_debut),
+                'date_fin': fields.Date.to_string(periode.date_fin),
+                'state': periode.state,
+            } if periode else None
+        return {'status': 'success', 'periode': data}
+
     @http.route('/api/pos_paie/periodes', type='json', auth='user', methods=['GET', 'POST'], csrf=False)
     def list_periodes(self, **payload):
-        params = http.request.jsonrequest or payload or {}
-        if isinstance(params, dict) and 'params' in params and isinstance(params.get('params'), dict):
-            params = params['params']
+        params = self._get_params(payload)
         limit = int(params.get('limit') or 50)
         offset = int(params.get('offset') or 0)
-        Per = request.env['pos.paie.periode'].sudo()
-        total = Per.search_count([])
-        periodes = Per.search([], limit=limit, offset=offset, order='date_debut desc, id desc')
-        data = [{
-            'id': p.id,
-            'name': p.name,
-            'date_debut': fields.Date.to_string(p.date_debut) if p.date_debut else None,
-            'date_fin': fields.Date.to_string(p.date_fin) if p.date_fin else None,
-            'nb_vendeurs': len(p.ligne_ids),
-            'total_commandes': int(sum(p.ligne_ids.mapped('total_commandes')) if p.ligne_ids else 0.0),
-            'total_bp': int(sum(p.ligne_ids.mapped('total_bp')) if p.ligne_ids else 0.0),
-            'commission_total': int(sum(p.ligne_ids.mapped('commission')) if p.ligne_ids else 0.0),
-            'montant_net_total': int(sum(p.ligne_ids.mapped('montant_net')) if p.ligne_ids else 0.0),
-            'paies': [{'id': paie.vendeur_id.id, 'name': paie.vendeur_id.name, 'carte_numero': paie.vendeur_id.carte_numero, 'nb_commandes': paie.nb_commandes, 'total_commandes': paie.total_commandes, 'total_bp': paie.total_bp, 'commission': paie.commission, 'montant_net': paie.montant_net} for paie in p.ligne_ids] if p.ligne_ids else [],
-        } for p in periodes]
+        with self._read_env() as env:
+            Per = env['pos.paie.periode'].sudo()
+            total = Per.search_count([])
+            periodes = Per.search([], limit=limit, offset=offset, order='date_debut desc, id desc')
+            data = [{
+                'id': p.id,
+                'name': p.name,
+                'date_debut': fields.Date.to_string(p.date_debut) if p.date_debut else None,
+                'date_fin': fields.Date.to_string(p.date_fin) if p.date_fin else None,
+                'nb_vendeurs': len(p.ligne_ids) + p.archive_nb_vendeurs,
+                # Totaux d'en-tête: lignes actives + résumé des lignes archivées
+                'total_commandes': int(p.total_commandes),
+                'total_bp': int(p.total_bp),
+                'commission_total': int(p.commission_total),
+                'montant_net_total': int(p.montant_net_total),
+                'lignes_archivees': p.lignes_archivees,
+                'paies': p._paies_detail(),
+            } for p in periodes]
         return {'status': 'success', 'periodes': data, 'total': total, 'offset': offset, 'limit': limit}
 
     @http.route('/api/pos_paie/payer_commandes', type='json', auth='user', methods=['POST'], csrf=False)
     def payer_commandes(self, **payload):
         """Marquer les commandes spécifiées comme payées (paiement_state = 'payee')"""
         try:
-            params = http.request.jsonrequest or payload or {}
-            if isinstance(params, dict) and 'params' in params and isinstance(params.get('params'), dict):
-                params = params['params']
+            params = self._get_params(payload)
             
             commande_ids = params.get('commande_ids', [])
             if not commande_ids or not isinstance(commande_ids, list):
@@ -380,3 +622,65 @@ class PosPaieApi(http.Controller):
             import logging
             logging.exception("Erreur dans payer_commandes")
             return {'status': 'error', 'message': str(e)}
+
+    @http.route('/api/pos_paie/abonnement', type='json', auth='user', methods=['POST'], csrf=False)
+    def abonnement(self, **payload):
+        """Instantané des totaux par vendeur pour le suivi des deltas (pos_paie/delta).
+
+        Le client applique ensuite les notifications de type ``pos_paie/delta``
+        reçues via /longpolling/poll à partir de l'identifiant ``last``, en
+        ignorant celles dont l'id figure dans ``inclus`` (déjà comptées dans
+        l'instantané): le canal privé des deltas est ajouté au poll par le
+        serveur pour les utilisateurs paie (voir PosPaieBusController).
+
+        ``last`` est pris avec une marge de ``pos_paie.abonnement_marge``
+        secondes (défaut 10): une transaction concurrente peut avoir obtenu un
+        id de bus plus petit sans être encore committée, elle n'est alors ni
+        dans l'instantané ni après le plus grand id visible. Une transaction
+        restée ouverte plus longtemps que la marge peut encore être manquée:
+        le client recharge l'instantané périodiquement.
+        """
+        user = request.env.user
+        if not (user.has_group('pos_paie.group_pos_paie_manager') or user.has_group('pos_paie.group_pos_paie_user')):
+            return {'status': 'error', 'message': "Accès refusé"}
+        params = self._get_params(payload)
+        date_debut = params.get('date_debut')
+        date_fin = params.get('date_fin')
+        if not (date_debut and date_fin):
+            return {'status': 'error', 'message': 'date_debut et date_fin sont requis'}
+        try:
+            pourcentage = float(params.get('pourcentage') if params.get('pourcentage') is not None else 0.25)
+        except Exception:
+            return {'status': 'error', 'message': 'pourcentage invalide'}
+        try:
+            fields.Date.from_string(date_debut)
+            fields.Date.from_string(date_fin)
+        except Exception:
+            return {'status': 'error', 'message': 'Format de date invalide (YYYY-MM-DD attendu)'}
+        # Même transaction (et instantané) que les totaux ci-dessous: les deltas
+        # visibles ici y sont déjà comptés, les autres restent à appliquer
+        marge = float(request.env['ir.config_parameter'].sudo().get_param('pos_paie.abonnement_marge', 10))
+        cr = request.env.cr
+        channel = request.env['pos.caisse.commande']._paie_bus_channel()
+        channel_key = json_dump(channel_with_db(cr.dbname, channel)) if channel else None
+        cr.execute("""
+            SELECT id, channel FROM bus_bus
+            WHERE create_date >= (now() at time zone 'UTC') - %s * interval '1 second'
+            ORDER BY id
+        """, (marge,))
+        recents = cr.fetchall()
+        if recents:
+            last = recents[0][0] - 1
+        else:
+            cr.execute("SELECT COALESCE(MAX(id), 0) FROM bus_bus")
+            last = cr.fetchone()[0]
+        inclus = [bus_id for bus_id, bus_channel in recents if channel_key and bus_channel == channel_key]
+        return {
+            'status': 'success',
+            'type': PAIE_BUS_TYPE,
+            'last': last,
+            'inclus': inclus,
+            'date_debut': date_debut,
+            'date_fin': date_fin,
+            'vendeurs': self._vendeurs_totaux(request.env, date_debut, date_fin, pourcentage),
+        }
@@ -1 +1,5 @@
 from . import pos_paie
+from . import pos_caisse_vendeur
+from . import pos_caisse_commande
+from . import pos_paie_calcul_cache
+from . import pos_paie_archive
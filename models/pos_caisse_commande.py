@@ -0,0 +1,103 @@
+from odoo import models, fields, api
+
+# Les deltas de paie par carte sont poussés sur le canal bus du groupe
+# utilisateur paie (canal enregistrement, ajouté au poll des seuls membres
+# des groupes pos_paie par PosPaieBusController)
+PAIE_BUS_GROUP = 'pos_paie.group_pos_paie_user'
+PAIE_BUS_TYPE = 'pos_paie/delta'
+
+# Champs de pos.caisse.commande qui influencent les totaux de paie
+PAIE_FIELDS = {'client_card', 'total', 'type_paiement', 'state', 'paiement_state', 'date'}
+
+
+class PosCaisseCommande(models.Model):
+    _inherit = 'pos.caisse.commande'
+
+    def _paie_contributions(self):
+        """Contribution de chaque commande aux totaux de paie.
+
+        Retourne {commande_id: (carte, date, total, total_bp)} pour les commandes
+        comptées dans la paie (carte renseignée, non annulée, non payée).
+        """
+        res = {}
+        for c in self:
+            if not c.client_card or c.state == 'annule' or c.paiement_state != 'non_payee':
+                continue
+            total = c.total or 0.0
+            res[c.id] = (
+                c.client_card,
+                fields.Date.to_string(fields.Date.to_date(c.date)) if c.date else None,
+                total,
+                total if c.type_paiement == 'bp' else 0.0,
+            )
+        return res
+
+    def _paie_event(self, before, after, deleted=False):
+        """Nature du changement d'une commande entre deux contributions."""
+        if before and not after:
+            if deleted:
+                return 'delete'
+            if self.state == 'annule':
+                return 'cancel'
+            if self.paiement_state == 'payee':
+                return 'paid'
+        elif after and not before:
+            return 'new'
+        return 'update'
+
+    @api.model
+    def _paie_bus_channel(self):
+        """Canal bus privé des deltas de paie (groupe res.groups), ou None."""
+        return self.env.ref(PAIE_BUS_GROUP, raise_if_not_found=False)
+
+    def _paie_notifier(self, before, after, deleted=False):
+        """Pousse sur le bus les deltas par commande/carte entre ``before`` et ``after``.
+
+        ``deleted``: les commandes viennent d'être supprimées (appel depuis unlink).
+        """
+        deltas = []
+        for cid in set(before) | set(after):
+            old, new = before.get(cid), after.get(cid)
+            if old == new:
+                continue
+            event = self.browse(cid)._paie_event(old, new, deleted=deleted)
+            # Un changement de carte ou de date se traduit par un retrait puis un ajout
+            if old and new and old[:2] != new[:2]:
+                pairs = [(old, None), (None, new)]
+            else:
+                pairs = [(old, new)]
+            for o, n in pairs:
+                ref = n or o
+                deltas.append({
+                    'commande_id': cid,
+                    'event': event,
+                    'carte': ref[0],
+                    'date': ref[1],
+                    'nb': (1 if n else 0) - (1 if o else 0),
+                    'total': (n[2] if n else 0.0) - (o[2] if o else 0.0),
+                    'total_bp': (n[3] if n else 0.0) - (o[3] if o else 0.0),
+                })
+        channel = self._paie_bus_channel() if deltas else None
+        if channel:
+            self.env['bus.bus']._sendone(channel, PAIE_BUS_TYPE, {'deltas': deltas})
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        records._paie_notifier({}, records._paie_contributions())
+        return records
+
+    def write(self, vals):
+        if not PAIE_FIELDS.intersection(vals):
+            return super().write(vals)
+        before = self._paie_contributions()
+        res = super().write(vals)
+        self._paie_notifier(before, self._paie_contributions())
+        return res
+
+    def unlink(self):
+        before = self._paie_contributions()
+        ids = self.ids
+        res = super().unlink()
+        self.browse(ids)._paie_notifier(before, {}, deleted=True)
+        return res
@@ -0,0 +1,67 @@
+from collections import namedtuple
+
+from odoo import models, api, tools
+
+# Entrée de l'index carte -> vendeur (valeurs immuables, partagées entre requêtes)
+VendeurCarte = namedtuple('VendeurCarte', ['id', 'name', 'short_name', 'pourcentage'])
+
+# Champs dont dépend l'index: seule leur écriture invalide le cache
+INDEX_FIELDS = {'carte_numero', 'name', 'pourcentage_commission', 'active'}
+
+
+class PosCaisseVendeur(models.Model):
+    _inherit = 'pos.caisse.vendeur'
+
+    @api.model
+    @tools.ormcache()
+    def _get_index_vendeurs(self):
+        """Index des vendeurs actifs conservé en mémoire (ormcache).
+
+        Retourne ``(par_carte, par_id)``: carte_numero -> VendeurCarte et
+        id -> VendeurCarte. Invalidé par create/unlink et par un write touchant
+        ``INDEX_FIELDS``. Les dictionnaires retournés sont partagés: ne pas les
+        modifier.
+        """
+        vendeurs = self.sudo().search([])
+        par_carte, par_id = {}, {}
+        for vid, display_name in vendeurs.name_get():
+            v = vendeurs.browse(vid)
+            short_name = display_name.split('-')[-1].strip() if display_name else ''
+            entry = VendeurCarte(
+                vid,
+                display_name or '',
+                short_name,
+                getattr(v, 'pourcentage_commission', 25) or 25,
+            )
+            par_id[vid] = entry
+            if v.carte_numero:
+                par_carte[v.carte_numero] = entry
+        return par_carte, par_id
+
+    @api.model
+    def _get_index_cartes(self):
+        """Index carte_numero -> VendeurCarte des vendeurs actifs."""
+        return self._get_index_vendeurs()[0]
+
+    @api.model
+    def _resoudre_cartes(self, cards):
+        """Retourne {carte: VendeurCarte} pour les cartes connues parmi ``cards``."""
+        index = self._get_index_cartes()
+        return {card: index[card] for card in cards if card in index}
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.clear_caches()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        if INDEX_FIELDS.intersection(vals):
+            self.clear_caches()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.clear_caches()
+        return res
@@ -1,7 +1,17 @@
 from odoo import models, fields, api
+from odoo.exceptions import UserError, ValidationError
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
+from contextlib import closing
 import logging
+import psycopg2
+import uuid
+
+from ..tools.calcul import calculer_commissions
+
+# Plage de dates d'une période; LEAST/GREATEST: une ligne aux dates inversées
+# ne fait pas échouer daterange() (contrainte, index, recherches)
+PLAGE_PERIODE_SQL = "daterange(LEAST(date_debut, date_fin), GREATEST(date_debut, date_fin), '[]')"
 
 class PaieVendeur(models.Model):
     _name = 'pos.paie.vendeur'
@@ -23,6 +33,10 @@ class PaieVendeur(models.Model):
     pourcentage = fields.Float('Pourcentage retenu', default=25.0)
     date_paiement = fields.Date('Date de paiement')
     commande_ids = fields.One2many('pos.paie.commande', 'paie_id', string='Commandes')
+    # Commandes déplacées vers pos.paie.commande.archive (total conservé)
+    commandes_archivees = fields.Boolean('Commandes archivées', readonly=True, copy=False)
+    archive_total_commandes = fields.Float('Total commandes archivées', readonly=True, copy=False)
+    archive_total_bp = fields.Float('Total BP archivé', readonly=True, copy=False)
     state = fields.Selection([
         ('draft', 'Brouillon'),
         ('done', 'Terminé'),
@@ -48,11 +62,11 @@ class PaieVendeur(models.Model):
         self._populate_commandes_for_period()
         self.calculer_paie()
     # changer l'etat de la paie si toutes les commandes sont payées
-    @api.depends('commande_ids.commande_id.paiement_state')
+    @api.depends('commande_ids.commande_id.paiement_state', 'commandes_archivees')
     def _compute_state(self):
         for rec in self:
             if not rec.commande_ids:
-                rec.state = 'draft'
+                rec.state = 'done' if rec.commandes_archivees else 'draft'
                 continue
             all_paid = all(line.commande_id and line.commande_id.paiement_state == 'payee' for line in rec.commande_ids)
             if all_paid:
@@ -73,6 +87,8 @@ class PaieVendeur(models.Model):
 
     def _populate_commandes_for_period(self):
         self.ensure_one()
+        if self.commandes_archivees:
+            raise UserError("Impossible de recharger les commandes d'une paie dont les commandes sont archivées.")
         Cmd = self.env['pos.caisse.commande']
         domain = [
             ('client_card', '=', self.carte_numero), 
@@ -93,19 +109,67 @@ class PaieVendeur(models.Model):
         }) for c in commandes]
         self.commande_ids = [(5, 0, 0)] + lines
 
-    @api.depends('commande_ids.montant')
+    @api.depends('commande_ids.montant', 'archive_total_commandes')
     def _compute_totaux(self):
         for rec in self:
-            rec.total_commandes = sum(rec.commande_ids.mapped('montant')) if rec.commande_ids else 0.0
+            rec.total_commandes = (sum(rec.commande_ids.mapped('montant')) if rec.commande_ids else 0.0) + rec.archive_total_commandes
+
+    @api.model
+    def _archiver_commandes(self, limite):
+        """Déplace les commandes des paies terminées avant ``limite`` vers l'archive partitionnée."""
+        paies = self.search([
+            ('state', '=', 'done'),
+            ('commandes_archivees', '=', False),
+            ('date_fin', '<', limite),
+        ])
+        if not paies:
+            return 0
+        for paie in paies:
+            paie.write({
+                'archive_total_commandes': paie.total_commandes,
+                'archive_total_bp': paie._total_bp(),
+                'commandes_archivees': True,
+            })
+        self.env['pos.paie.commande'].flush()
+        cr = self.env.cr
+        cr.execute("SELECT DISTINCT date FROM pos_paie_commande WHERE paie_id = ANY(%s)", (paies.ids,))
+        self.env['pos.paie.commande.archive']._ensure_partitions([row[0] for row in cr.fetchall()])
+        cr.execute("""
+            INSERT INTO pos_paie_commande_archive (paie_id, commande_id, montant, date)
+            SELECT paie_id, commande_id, montant, date FROM pos_paie_commande WHERE paie_id = ANY(%s)
+        """, (paies.ids,))
+        count = cr.rowcount
+        cr.execute("DELETE FROM pos_paie_commande WHERE paie_id = ANY(%s)", (paies.ids,))
+        self.env['pos.paie.commande'].invalidate_cache()
+        paies.invalidate_cache(['commande_ids'])
+        return count
+
+    def unlink(self):
+        # La table d'archive (partitionnée) n'a pas de clé étrangère vers la paie
+        self.env.cr.execute("DELETE FROM pos_paie_commande_archive WHERE paie_id = ANY(%s)", (self.ids,))
+        return super().unlink()
+
+    def _total_bp(self):
+        """Total BP à retrancher: lignes de commandes + total BP archivé."""
+        self.ensure_one()
+        return sum(
+            line.montant for line in self.commande_ids
+            if getattr(line.commande_id, 'type_paiement', False) == 'bp'
+        ) + self.archive_total_bp
 
     def calculer_paie(self):
-        for rec in self:
-            # Total BP à retrancher
-            total_bp = sum(
-                line.montant for line in rec.commande_ids
-                if getattr(line.commande_id, 'type_paiement', False) == 'bp'
-            )
-            rec.montant_paye = (rec.total_commandes * (rec.pourcentage/100 or 0.0)) - total_bp
+        if not self:
+            return
+        # Même formule que la ligne de période: frais de carte déduits si la paie a des commandes
+        frais_carte = self.env['pos.paie.periode']._frais_carte()
+        _commissions, nets = calculer_commissions(
+            [rec.total_commandes for rec in self],
+            [rec._total_bp() for rec in self],
+            [(rec.pourcentage or 0.0) / 100.0 for rec in self],
+            frais_carte=[frais_carte if rec.commande_ids or rec.commandes_archivees else 0.0 for rec in self],
+        )
+        for rec, net in zip(self, nets):
+            rec.montant_paye = float(net)
 
     def action_confirmer_paie(self):
         """Confirmer la paie et marquer les commandes comme payées"""
@@ -227,8 +291,13 @@ class PosPaieWizard(models.TransientModel):
         commandes = self.env['pos.caisse.commande'].search(domain)
         total_all = sum(commandes.mapped('total')) if commandes else 0.0
         total_bp = sum(c.total for c in commandes if getattr(c, 'type_paiement', False) == 'bp') if commandes else 0.0
+        # pourcentage en points (25.0 == 25 %), comme sur pos.paie.vendeur; frais de carte si commandes
+        frais_carte = self.env['pos.paie.periode']._frais_carte() if commandes else 0.0
+        _commissions, nets = calculer_commissions(
+            [total_all], [total_bp], (self.pourcentage or 0.0) / 100.0, frais_carte=frais_carte,
+        )
         self.total_commandes = total_all
-        self.montant_net = (total_all * (self.pourcentage or 0.0)) - total_bp
+        self.montant_net = float(nets[0])
 
     def action_confirmer_paie(self):
         """Confirmer la paie du wizard et marquer les commandes comme payées"""
@@ -296,6 +365,14 @@ class PosPaiePeriode(models.Model):
     total_bp = fields.Float('Total BP', compute='_compute_totaux', store=False)
     commission_total = fields.Float('Commission totale', compute='_compute_totaux', store=False)
     montant_net_total = fields.Float('Montant net total', compute='_compute_totaux', store=False)
+    # Lignes déplacées vers pos.paie.periode.ligne.archive: totaux résumés conservés en ligne
+    ligne_archive_ids = fields.One2many('pos.paie.periode.ligne.archive', 'periode_id', string='Lignes archivées')
+    lignes_archivees = fields.Boolean('Lignes archivées', readonly=True, copy=False)
+    archive_nb_vendeurs = fields.Integer('Nb vendeurs archivés', readonly=True, copy=False)
+    archive_total_commandes = fields.Float('Total commandes archivées', readonly=True, copy=False)
+    archive_total_bp = fields.Float('Total BP archivé', readonly=True, copy=False)
+    archive_commission_total = fields.Float('Commission archivée', readonly=True, copy=False)
+    archive_montant_net_total = fields.Float('Montant net archivé', readonly=True, copy=False)
     state = fields.Selection([
         ('confirm', 'Confirmé'),
         ('done', 'Terminé'),
@@ -308,19 +385,196 @@ class PosPaiePeriode(models.Model):
         end = today + relativedelta(day=31)
         return f"Paie {start} → {end}"
 
-    @api.depends('ligne_ids.total_commandes', 'ligne_ids.total_bp', 'ligne_ids.commission', 'ligne_ids.montant_net')
+    def init(self):
+        # Plage de dates indexée (GiST) et exclusion des chevauchements entre périodes non annulées
+        cr = self.env.cr
+        cr.execute("""
+            SELECT pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conname = 'pos_paie_periode_no_overlap' AND conrelid = 'pos_paie_periode'::regclass
+        """)
+        row = cr.fetchone()
+        if row and 'LEAST' in row[0].upper():
+            return
+        if row:
+            # Ancienne définition sur daterange(date_debut, date_fin): même expression partout
+            cr.execute("ALTER TABLE pos_paie_periode DROP CONSTRAINT pos_paie_periode_no_overlap")
+        try:
+            with cr.savepoint(flush=False):
+                cr.execute(f"""
+                    ALTER TABLE pos_paie_periode ADD CONSTRAINT pos_paie_periode_no_overlap
+                    EXCLUDE USING gist ({PLAGE_PERIODE_SQL} WITH &&)
+                    WHERE (state != 'cancel')
+                """)
+            cr.execute("DROP INDEX IF EXISTS pos_paie_periode_daterange_idx")
+            return
+        except psycopg2.Error:
+            # Des périodes existantes se chevauchent: index GiST seul, le contrôle Python protège les nouvelles
+            logging.warning("pos_paie: périodes existantes qui se chevauchent, contrainte d'exclusion non créée")
+        try:
+            with cr.savepoint(flush=False):
+                cr.execute("DROP INDEX IF EXISTS pos_paie_periode_daterange_idx")
+                cr.execute(f"CREATE INDEX pos_paie_periode_daterange_idx ON pos_paie_periode USING gist ({PLAGE_PERIODE_SQL})")
+        except psycopg2.Error:
+            logging.exception("pos_paie: index des plages de périodes non créé")
+
+    def _check_chevauchement(self, plages):
+        """Contrôle, avant écriture, les plages ``[(id, nom, date_debut, date_fin, state)]``.
+
+        Lève une ValidationError si une date de début suit la date de fin, si
+        deux plages non annulées se chevauchent entre elles ou avec une période
+        existante (hors ``self``). Fait en Python avant l'INSERT/UPDATE: la
+        contrainte d'exclusion lèverait sinon une erreur psycopg2 brute.
+        """
+        actives = []
+        for _id, name, date_debut, date_fin, state in plages:
+            date_debut, date_fin = fields.Date.to_date(date_debut), fields.Date.to_date(date_fin)
+            if date_debut and date_fin and date_debut > date_fin:
+                raise ValidationError("La date de début doit précéder la date de fin.")
+            if state != 'cancel' and date_debut and date_fin:
+                actives.append((date_debut, date_fin, name))
+        if not actives:
+            return
+        actives.sort()
+        fin_max, name_max = actives[0][1], actives[0][2]
+        for date_debut, date_fin, name in actives[1:]:
+            if date_debut <= fin_max:
+                raise ValidationError(f"La période {name} chevauche: {name_max}")
+            fin_max, name_max = date_fin, name
+        self.flush(['date_debut', 'date_fin', 'state'])
+        for date_debut, date_fin, name in actives:
+            autres = self._periodes_chevauchantes(date_debut, date_fin)
+            if autres:
+                raise ValidationError(
+                    f"La période {name} chevauche: " + ', '.join(autres.mapped('name'))
+                )
+
+    def _periodes_chevauchantes(self, date_debut, date_fin):
+        """Périodes non annulées (hors ``self``) dont la plage croise [date_debut, date_fin]."""
+        self.env.cr.execute(f"""
+            SELECT id FROM pos_paie_periode
+            WHERE state != 'cancel'
+              AND id != ALL(%s)
+              AND {PLAGE_PERIODE_SQL} && daterange(%s, %s, '[]')
+        """, (self.ids or [0], date_debut, date_fin))
+        return self.browse([row[0] for row in self.env.cr.fetchall()])
+
+    @api.model
+    def _periode_pour_date(self, day):
+        """Période non annulée contenant ``day`` (recherche via l'index GiST)."""
+        if not day:
+            return self.browse()
+        self.flush(['date_debut', 'date_fin', 'state'])
+        self.env.cr.execute(f"""
+            SELECT id FROM pos_paie_periode
+            WHERE state != 'cancel'
+              AND {PLAGE_PERIODE_SQL} @> %s::date
+            ORDER BY date_debut DESC, id DESC
+            LIMIT 1
+        """, (fields.Date.to_date(day),))
+        row = self.env.cr.fetchone()
+        return self.browse(row[0] if row else [])
+
+    @api.model
+    def _periode_pour_commande(self, commande):
+        """Période non annulée à laquelle appartient la commande (pos.caisse.commande)."""
+        return self._periode_pour_date(fields.Date.to_date(commande.date) if commande.date else None)
+
+    @api.depends('ligne_ids.total_commandes', 'ligne_ids.total_bp', 'ligne_ids.commission', 'ligne_ids.montant_net',
+                 'archive_total_commandes', 'archive_total_bp', 'archive_commission_total', 'archive_montant_net_total')
     def _compute_totaux(self):
         for rec in self:
-            rec.total_commandes = sum(rec.ligne_ids.mapped('total_commandes'))
-            rec.total_bp = sum(rec.ligne_ids.mapped('total_bp'))
+            rec.total_commandes = sum(rec.ligne_ids.mapped('total_commandes')) + rec.archive_total_commandes
+            rec.total_bp = sum(rec.ligne_ids.mapped('total_bp')) + rec.archive_total_bp
             rec.total_cash = rec.total_commandes - rec.total_bp
-            rec.commission_total = sum(rec.ligne_ids.mapped('commission'))
-            rec.montant_net_total = sum(rec.ligne_ids.mapped('montant_net'))
+            rec.commission_total = sum(rec.ligne_ids.mapped('commission')) + rec.archive_commission_total
+            rec.montant_net_total = sum(rec.ligne_ids.mapped('montant_net')) + rec.archive_montant_net_total
 
     def action_recompute(self):
+        if any(self.mapped('lignes_archivees')):
+            raise UserError("Impossible de recalculer une période dont les lignes sont archivées.")
         for rec in self:
             rec._recompute_lines()
         return True
+
+    def _paies_detail(self):
+        """Lignes par vendeur de la période, actives puis archivées."""
+        self.ensure_one()
+        lignes = [{
+            'id': paie.vendeur_id.id,
+            'name': paie.vendeur_id.name,
+            'carte_numero': paie.vendeur_id.carte_numero,
+            'nb_commandes': paie.nb_commandes,
+            'total_commandes': paie.total_commandes,
+            'total_bp': paie.total_bp,
+            'commission': paie.commission,
+            'montant_net': paie.montant_net,
+        } for paie in self.ligne_ids]
+        lignes += [{
+            'id': arch.vendeur_id.id,
+            'name': arch.vendeur_name,
+            'carte_numero': arch.vendeur_card,
+            'nb_commandes': arch.nb_commandes,
+            'total_commandes': arch.total_commandes,
+            'total_bp': arch.total_bp,
+            'commission': arch.commission,
+            'montant_net': arch.montant_net,
+        } for arch in self.ligne_archive_ids]
+        return lignes
+
+    @api.model
+    def _archiver_lignes(self, limite):
+        """Déplace les lignes des périodes closes terminées avant ``limite`` vers l'archive partitionnée.
+
+        Les totaux de la période sont conservés dans les champs archive_* pour
+        que l'en-tête reste exact; le détail par vendeur reste lisible dans
+        pos.paie.periode.ligne.archive.
+        """
+        periodes = self.search([
+            ('state', 'in', ('done', 'cancel')),
+            ('lignes_archivees', '=', False),
+            ('date_fin', '<', limite),
+        ])
+        if not periodes:
+            return 0
+        self.env['pos.paie.periode.ligne'].flush()
+        cr = self.env.cr
+        for periode in periodes:
+            vals = {
+                'lignes_archivees': True,
+                'archive_nb_vendeurs': periode.archive_nb_vendeurs + len(periode.ligne_ids),
+                'archive_total_commandes': periode.total_commandes,
+                'archive_total_bp': periode.total_bp,
+                'archive_commission_total': periode.commission_total,
+                'archive_montant_net_total': periode.montant_net_total,
+            }
+            periode.write(vals)
+        self.env['pos.paie.periode.ligne.archive']._ensure_partitions(periodes.mapped('date_debut'))
+        cr.execute("""
+            INSERT INTO pos_paie_periode_ligne_archive
+                (periode_id, vendeur_id, vendeur_card, vendeur_name, nb_commandes, total_commandes,
+                 total_bp, pourcentage, commission, montant_net, date_debut)
+            SELECT l.periode_id, l.vendeur_id, v.carte_numero, l.vendeur_name, l.nb_commandes, l.total_commandes,
+                   l.total_bp, l.pourcentage, l.commission, l.montant_net, p.date_debut
+            FROM pos_paie_periode_ligne l
+            JOIN pos_paie_periode p ON p.id = l.periode_id
+            LEFT JOIN pos_caisse_vendeur v ON v.id = l.vendeur_id
+            WHERE l.periode_id = ANY(%s)
+        """, (periodes.ids,))
+        count = cr.rowcount
+        cr.execute("DELETE FROM pos_paie_periode_ligne WHERE periode_id = ANY(%s)", (periodes.ids,))
+        self.env['pos.paie.periode.ligne'].invalidate_cache()
+        periodes.invalidate_cache(['ligne_ids', 'ligne_archive_ids'])
+        return count
+
+    @api.model
+    def _cron_archiver(self):
+        """Archive les lignes plus anciennes que ``pos_paie.archive_age_mois`` mois (défaut 24)."""
+        age = int(self.env['ir.config_parameter'].sudo().get_param('pos_paie.archive_age_mois', 24))
+        limite = fields.Date.context_today(self) - relativedelta(months=age)
+        nb_lignes = self._archiver_lignes(limite)
+        nb_commandes = self.env['pos.paie.vendeur']._archiver_commandes(limite)
+        logging.info("pos_paie: archivage avant le %s: %s lignes de période, %s commandes de paie", limite, nb_lignes, nb_commandes)
+        return True
     
     def action_confirmer_paies_periode(self):
         """Confirmer toutes les paies de la période et marquer les commandes comme payées"""
@@ -370,50 +624,32 @@ class PosPaiePeriode(models.Model):
         self.ensure_one()
         # Clear existing lines
         self.ligne_ids = [(5, 0, 0)]
-        Cmd = self.env['pos.caisse.commande'].sudo()
         V = self.env['pos.caisse.vendeur'].sudo()
-        # Build date range
-        start_dt = datetime.combine(self.date_debut, datetime.min.time()) if self.date_debut else None
-        end_dt = datetime.combine(self.date_fin, datetime.max.time()) if self.date_fin else None
-        domain = [
-            ('state', '!=', 'annule'),
-            ('paiement_state', '=', 'non_payee')  # Ne prendre que les commandes non payées
-        ]
-        if start_dt:
-            domain.append(('date', '>=', fields.Datetime.to_string(start_dt)))
-        if end_dt:
-            domain.append(('date', '<=', fields.Datetime.to_string(end_dt)))
-        commandes = Cmd.search(domain)
-        if not commandes:
+        # Aggregate per card (server-side cursor, bounded memory)
+        by_card = self._agreger_commandes_stream(self.date_debut, self.date_fin)
+        if not by_card:
             return
-        # Group by client_card
-        cards = set(c.client_card for c in commandes if getattr(c, 'client_card', False))
-        vendeurs = V.search([('carte_numero', 'in', list(cards))]) if cards else V.browse([])
-        vend_by_card = {v.carte_numero: v for v in vendeurs}
-        # Aggregate per card
-        by_card = {}
-        for c in commandes:
-            card = getattr(c, 'client_card', False)
-            if not card:
-                continue
-            agg = by_card.setdefault(card, {'nb': 0, 'total': 0.0, 'total_bp': 0.0})
-            agg['nb'] += 1
-            agg['total'] += c.total
-            if getattr(c, 'type_paiement', False) == 'bp':
-                agg['total_bp'] += c.total
+        vend_by_card = V._resoudre_cartes(by_card)
+        cards = [card for card in by_card if card in vend_by_card]
+        if not cards:
+            return
+        # Commission / net de toutes les cartes en un seul calcul vectorisé
+        commissions, nets = calculer_commissions(
+            [by_card[card]['total'] for card in cards],
+            [by_card[card]['total_bp'] for card in cards],
+            [vend_by_card[card].pourcentage / 100.0 for card in cards],
+            frais_carte=self._frais_carte(),
+        )
         # Create lines
         lines_vals = []
-        for card, vals in by_card.items():
-            v = vend_by_card.get(card)
-            if not v:
-                continue
-            pourc = (getattr(v, 'pourcentage_commission', 25) or 25) / 100.0
-            logging.info(f"================= Vendeur {v.id} ({v.display_name}) - Nb commandes: {vals['nb']}, Total: {vals['total']}, Total BP: {vals['total_bp']}, Pourcentage: {pourc}%")
-            commission = vals['total'] * pourc
+        for card, commission, montant_net in zip(cards, commissions, nets):
+            v = vend_by_card[card]
+            vals = by_card[card]
+            pourc = v.pourcentage / 100.0
+            logging.info(f"================= Vendeur {v.id} ({v.name}) - Nb commandes: {vals['nb']}, Total: {vals['total']}, Total BP: {vals['total_bp']}, Pourcentage: {pourc}%")
             logging.info(f"Calculating commission for vendeur {v.id}: {commission}")
-            vendeur_name = v.display_name.split('-')[-1].strip() if v.display_name else ''
+            vendeur_name = v.short_name
             logging.info(f"================== Vendeur name for vendeur {v.id}: {vendeur_name}")
-            montant_net = commission - vals['total_bp']-500
             lines_vals.append((0, 0, {
                 'vendeur_id': v.id,
                 'vendeur_name': vendeur_name,
@@ -421,19 +657,104 @@ class PosPaiePeriode(models.Model):
                 'total_commandes': vals['total'],
                 'total_bp': vals['total_bp'],
                 'pourcentage': pourc,
-                'commission': commission,
-                'montant_net': montant_net,
+                'commission': float(commission),
+                'montant_net': float(montant_net),
             }))
         if lines_vals:
             self.ligne_ids = lines_vals
 
+    @api.model
+    def _frais_carte(self):
+        """Frais de carte déduits du net par vendeur sur une période (pos_paie.frais_carte, défaut 500 FC)."""
+        return float(self.env['ir.config_parameter'].sudo().get_param('pos_paie.frais_carte', 500))
+
+    @api.model
+    def _domain_commandes_periode(self, date_debut=None, date_fin=None):
+        """Domaine des commandes non payées et non annulées de la période."""
+        domain = [
+            ('state', '!=', 'annule'),
+            ('paiement_state', '=', 'non_payee')  # Ne prendre que les commandes non payées
+        ]
+        if date_debut:
+            start_dt = datetime.combine(fields.Date.to_date(date_debut), datetime.min.time())
+            domain.append(('date', '>=', fields.Datetime.to_string(start_dt)))
+        if date_fin:
+            end_dt = datetime.combine(fields.Date.to_date(date_fin), datetime.max.time())
+            domain.append(('date', '<=', fields.Datetime.to_string(end_dt)))
+        return domain
+
+    @api.model
+    def _agreger_commandes_stream(self, date_debut=None, date_fin=None, batch_size=None):
+        """Agrège par carte les commandes de la période via un curseur serveur nommé.
+
+        Les commandes sont lues par lots de ``batch_size`` lignes et repliées dans
+        un accumulateur par carte (voir ``_stream_fold``): un seul lot est en
+        mémoire à la fois, quelle que soit la taille de l'historique.
+        Retourne {carte: {'nb': int, 'total': float, 'total_bp': float}}.
+        """
+        if not batch_size:
+            batch_size = int(self.env['ir.config_parameter'].sudo().get_param('pos_paie.stream_batch_size', 2000))
+        Cmd = self.env['pos.caisse.commande'].sudo()
+        Cmd.flush(['client_card', 'total', 'type_paiement', 'state', 'paiement_state', 'date'])
+        query = Cmd._where_calc(self._domain_commandes_periode(date_debut, date_fin))
+        table = Cmd._table
+        query_str, params = query.select(*[
+            '"%s"."%s"' % (table, col) for col in ('id', 'client_card', 'total', 'type_paiement', 'date')
+        ])
+        by_card = {}
+        # Le curseur nommé partage la transaction (et donc l'instantané) du curseur courant
+        with closing(self.env.cr._cnx.cursor('pos_paie_stream_%s' % uuid.uuid4().hex)) as stream:
+            stream.itersize = batch_size
+            stream.execute(query_str, params)
+            while True:
+                rows = stream.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    if not row[1]:
+                        continue
+                    acc = by_card.get(row[1])
+                    if acc is None:
+                        acc = by_card[row[1]] = {'nb': 0, 'total': 0.0, 'total_bp': 0.0}
+                    self._stream_fold(acc, row)
+        return by_card
+
+    @api.model
+    def _stream_fold(self, acc, row):
+        """Replie une commande ``(id, client_card, total, type_paiement, date)`` dans
+        l'accumulateur de sa carte. Point d'extension pour des règles de
+        commission spécifiques par commande."""
+        total = row[2] or 0.0
+        acc['nb'] += 1
+        acc['total'] += total
+        if row[3] == 'bp':
+            acc['total_bp'] += total
+
     # surcharge de la methode create pour forcer le recalcul des lignes
     @api.model
     def create(self, vals):
+        vals = self._add_missing_default_values(vals)
+        self._check_chevauchement([(None, vals.get('name'), vals.get('date_debut'), vals.get('date_fin'), vals.get('state'))])
         rec = super().create(vals)
         rec._recompute()
         return rec
 
+    def write(self, vals):
+        if {'date_debut', 'date_fin', 'state'}.intersection(vals):
+            self._check_chevauchement([(
+                rec.id,
+                vals.get('name', rec.name),
+                vals.get('date_debut', rec.date_debut),
+                vals.get('date_fin', rec.date_fin),
+                vals.get('state', rec.state),
+            ) for rec in self])
+        return super().write(vals)
+
+    def unlink(self):
+        # La table d'archive (partitionnée) n'a pas de clé étrangère vers la période
+        self.env.cr.execute("DELETE FROM pos_paie_periode_ligne_archive WHERE periode_id = ANY(%s)", (self.ids,))
+        return super().unlink()
+
 
 class PosPaiePeriodeLigne(models.Model):
     _name = 'pos.paie.periode.ligne'
@@ -464,9 +785,14 @@ class PosPaiePeriodeLigne(models.Model):
 
     @api.depends('vendeur_id')
     def _compute_vendeur_name(self):
+        index = self.env['pos.caisse.vendeur']._get_index_vendeurs()[1]
         for record in self:
-            if record.vendeur_id and record.vendeur_id.display_name:
-                sname = record.vendeur_id.display_name.split('-')[-1].strip()
+            v = index.get(record.vendeur_id.id) if record.vendeur_id else None
+            # Vendeur archivé (hors index): nom dérivé directement
+            sname = v.short_name if v else (
+                record.vendeur_id.display_name.split('-')[-1].strip() if record.vendeur_id.display_name else ''
+            )
+            if sname:
                 record.vendeur_name = sname
                 logging.info(f"================== Computed vendeur_name for vendeur_id {record.vendeur_id.id}: {sname}")
             else:
@@ -0,0 +1,112 @@
+from odoo import models, fields, api
+from dateutil.relativedelta import relativedelta
+
+
+class PosPaieArchiveMixin(models.AbstractModel):
+    """Table d'archive partitionnée par mois (PARTITION BY RANGE).
+
+    Les modèles héritant définissent ``_archive_columns`` (DDL des colonnes hors
+    ``id``) et ``_partition_column`` (colonne date servant de clé de partition).
+    La table est créée par ``init`` (``_auto = False``); une partition est créée
+    à la demande pour chaque mois archivé, les dates vides tombant dans la
+    partition par défaut.
+    """
+    _name = 'pos.paie.archive.mixin'
+    _description = 'Archive partitionnée par mois'
+
+    _archive_columns = ''
+    _partition_column = 'date'
+
+    def init(self):
+        if self._abstract:
+            return
+        cr = self.env.cr
+        cr.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self._table} (
+                id bigserial,
+                {self._archive_columns},
+                date_archive timestamp without time zone DEFAULT (now() at time zone 'UTC')
+            ) PARTITION BY RANGE ({self._partition_column})
+        """)
+        cr.execute(f"CREATE TABLE IF NOT EXISTS {self._table}_default PARTITION OF {self._table} DEFAULT")
+        cr.execute(f"CREATE INDEX IF NOT EXISTS {self._table}_id_idx ON {self._table} (id)")
+
+    @api.model
+    def _ensure_partitions(self, days):
+        """Crée les partitions mensuelles couvrant ``days`` (dates) si besoin."""
+        cr = self.env.cr
+        for month in sorted({d.replace(day=1) for d in days if d}):
+            name = f"{self._table}_y{month.year:04d}m{month.month:02d}"
+            cr.execute(f"""
+                CREATE TABLE IF NOT EXISTS {name} PARTITION OF {self._table}
+                FOR VALUES FROM (%s) TO (%s)
+            """, (month, month + relativedelta(months=1)))
+
+
+class PosPaiePeriodeLigneArchive(models.Model):
+    _name = 'pos.paie.periode.ligne.archive'
+    _inherit = 'pos.paie.archive.mixin'
+    _description = 'Ligne de paie archivée (période)'
+    _auto = False
+    _log_access = False
+    _order = 'date_debut desc, vendeur_card asc'
+
+    _partition_column = 'date_debut'
+    _archive_columns = """
+        periode_id integer NOT NULL,
+        vendeur_id integer,
+        vendeur_card varchar,
+        vendeur_name varchar,
+        nb_commandes integer,
+        total_commandes double precision,
+        total_bp double precision,
+        pourcentage double precision,
+        commission double precision,
+        montant_net double precision,
+        date_debut date NOT NULL
+    """
+
+    periode_id = fields.Many2one('pos.paie.periode', string='Période', readonly=True)
+    vendeur_id = fields.Many2one('pos.caisse.vendeur', string='Vendeur', readonly=True)
+    vendeur_card = fields.Char('Carte', readonly=True)
+    vendeur_name = fields.Char('Nom Vendeur', readonly=True)
+    nb_commandes = fields.Integer('Nb commandes', readonly=True)
+    total_commandes = fields.Float('Total commandes', readonly=True)
+    total_bp = fields.Float('Total BP', readonly=True)
+    pourcentage = fields.Float('Pourcentage', readonly=True)
+    commission = fields.Float('Commission', readonly=True)
+    montant_net = fields.Float('Montant net', readonly=True)
+    date_debut = fields.Date('Début de période', readonly=True)
+    date_archive = fields.Datetime('Archivé le', readonly=True)
+
+    def init(self):
+        super().init()
+        self.env.cr.execute(f"CREATE INDEX IF NOT EXISTS {self._table}_periode_id_idx ON {self._table} (periode_id)")
+
+
+class PosPaieCommandeArchive(models.Model):
+    _name = 'pos.paie.commande.archive'
+    _inherit = 'pos.paie.archive.mixin'
+    _description = 'Commande de paie vendeur archivée'
+    _auto = False
+    _log_access = False
+    _order = 'date desc, id desc'
+
+    _partition_column = 'date'
+    _archive_columns = """
+        paie_id integer NOT NULL,
+        commande_id integer,
+        montant double precision,
+        date date
+    """
+
+    paie_id = fields.Many2one('pos.paie.vendeur', string='Paie vendeur', readonly=True)
+    commande_id = fields.Many2one('pos.caisse.commande', string='Commande', readonly=True)
+    montant = fields.Float('Montant', readonly=True)
+    date = fields.Date('Date', readonly=True)
+    date_archive = fields.Datetime('Archivé le', readonly=True)
+
+    def init(self):
+        super().init()
+        self.env.cr.execute(f"CREATE INDEX IF NOT EXISTS {self._table}_paie_id_idx ON {self._table} (paie_id)")
+
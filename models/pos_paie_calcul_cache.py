@@ -0,0 +1,183 @@
+from odoo import models, fields, api
+import hashlib
+import json
+import logging
+import threading
+import time
+
+# Calculs en cours dans ce processus: clé -> _Vol
+_VOLS = {}
+_VOLS_LOCK = threading.Lock()
+
+
+class _Vol(object):
+    __slots__ = ('event', 'result', 'debut')
+
+    def __init__(self, debut):
+        self.event = threading.Event()
+        self.result = None
+        # Début de la transaction (instantané) du calcul de référence
+        self.debut = debut
+
+
+class PosPaieCalculCache(models.Model):
+    """Résultats récents des calculs de paie, partagés entre workers.
+
+    Sert de point de rendez-vous au « single-flight »: pour une même clé
+    (endpoint + paramètres), un seul calcul s'exécute; les requêtes identiques
+    concurrentes attendent et réutilisent son résultat, dans le même worker
+    (threading.Event) comme entre workers (verrou consultatif PostgreSQL + ligne
+    de résultat).
+
+    Un résultat n'est servi qu'aux appelants dont la transaction a commencé au
+    plus tard au début de la transaction du calcul (``date_calcul``): son
+    instantané est alors au moins aussi récent que celui qu'ils auraient lu
+    eux-mêmes (une requête qui suit un payer_commandes ne reçoit pas un calcul
+    commencé avant le paiement). Les autres calculent eux-mêmes: sous une rafale,
+    seule une partie des appelants est coalescée.
+    """
+    _name = 'pos.paie.calcul.cache'
+    _description = 'Résultat de calcul de paie partagé'
+    _log_access = False
+
+    cle = fields.Char('Clé', required=True, index=True)
+    resultat = fields.Text('Résultat (JSON)')
+    date_calcul = fields.Datetime('Instantané du calcul')
+    date_expiration = fields.Datetime('Expire le', required=True, index=True)
+
+    _sql_constraints = [
+        ('cle_unique', 'unique(cle)', 'Clé de calcul déjà présente.'),
+    ]
+
+    @api.model
+    def _cle(self, endpoint, params):
+        raw = json.dumps([self.env.cr.dbname, endpoint, params], sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    @api.model
+    def _debut_transaction(self):
+        """Début de la transaction courante (UTC): borne basse de son instantané."""
+        self.env.cr.execute("SELECT now() at time zone 'UTC'")
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _single_flight(self, endpoint, params, compute):
+        """Exécute ``compute()`` une seule fois pour les appels identiques simultanés.
+
+        ``compute`` doit retourner une valeur sérialisable en JSON et lire les
+        données via la transaction de la requête. Les appelants qui ont attendu
+        reçoivent une copie décodée du résultat.
+        """
+        key = self._cle(endpoint, params)
+        debut = self._debut_transaction()
+        with _VOLS_LOCK:
+            vol = _VOLS.get(key)
+            leader = vol is None
+            if leader:
+                vol = _VOLS[key] = _Vol(debut)
+        if not leader:
+            if vol.debut < debut:
+                # Calcul en cours sur un instantané antérieur au nôtre: inutilisable
+                return compute()
+            timeout = float(self.env['ir.config_parameter'].sudo().get_param('pos_paie.single_flight_timeout', 60))
+            if vol.event.wait(timeout) and vol.result is not None and vol.debut >= debut:
+                return json.loads(vol.result)
+            # Le calcul de référence a échoué ou expiré: on calcule nous-mêmes
+            return compute()
+        try:
+            result, vol.result, vol.debut = self._single_flight_db(key, compute, debut)
+            return result
+        finally:
+            vol.event.set()
+            with _VOLS_LOCK:
+                _VOLS.pop(key, None)
+
+    @api.model
+    def _single_flight_db(self, key, compute, debut):
+        """Coalescence entre workers; retourne (résultat, résultat sérialisé, début de son instantané).
+
+        ``debut`` est le début de la transaction de l'appelant. Le détenteur du
+        verrou publie d'abord le début de son instantané (ligne sans résultat):
+        un appelant plus récent n'attend pas un calcul qu'il ne pourrait pas
+        réutiliser. Le verrou consultatif est pris par ``pg_try_advisory_lock``
+        avec une échéance (``pos_paie.single_flight_timeout``): passé ce délai,
+        on calcule sans coalescence plutôt que de garder une connexion bloquée.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        ttl = int(ICP.get_param('pos_paie.single_flight_ttl', 5))
+        timeout = float(ICP.get_param('pos_paie.single_flight_timeout', 60))
+        lock_key = int(key[:15], 16)
+        # Curseur dédié: le verrou de session et la ligne de résultat sont
+        # indépendants de la transaction de la requête.
+        with self.pool.cursor() as cr:
+            if not self._prendre_verrou(cr, key, lock_key, debut, timeout):
+                result = compute()
+                return result, json.dumps(result, default=str), debut
+            try:
+                # Nouvel instantané après l'attente: voir le résultat publié par le détenteur du verrou
+                cr.commit()
+                cr.execute(
+                    """
+                    SELECT resultat, date_calcul FROM pos_paie_calcul_cache
+                    WHERE cle = %s AND resultat IS NOT NULL AND date_calcul >= %s
+                    """,
+                    (key, debut),
+                )
+                row = cr.fetchone()
+                if row:
+                    return json.loads(row[0]), row[0], row[1]
+                # Calcul en cours annoncé (sans résultat) pour les appelants qui arrivent
+                self._publier(cr, key, None, debut, ttl)
+                cr.commit()
+                result = compute()
+                payload = json.dumps(result, default=str)
+                self._publier(cr, key, payload, debut, ttl)
+                cr.commit()
+                return result, payload, debut
+            finally:
+                cr.rollback()
+                cr.execute("SELECT pg_advisory_unlock(%s)", (lock_key,))
+                cr.commit()
+
+    @api.model
+    def _publier(self, cr, key, payload, debut, ttl):
+        cr.execute(
+            """
+            INSERT INTO pos_paie_calcul_cache (cle, resultat, date_calcul, date_expiration)
+            VALUES (%s, %s, %s, (now() at time zone 'UTC') + %s * interval '1 second')
+            ON CONFLICT (cle) DO UPDATE
+            SET resultat = EXCLUDED.resultat, date_calcul = EXCLUDED.date_calcul,
+                date_expiration = EXCLUDED.date_expiration
+            """,
+            (key, payload, debut, ttl),
+        )
+
+    @api.model
+    def _prendre_verrou(self, cr, key, lock_key, debut, timeout):
+        """Attend le verrou consultatif ``lock_key`` au plus ``timeout`` secondes.
+
+        Retourne False sans attendre si le calcul en cours porte sur un
+        instantané antérieur à ``debut``.
+        """
+        echeance = time.monotonic() + timeout
+        pause = 0.02
+        while True:
+            cr.execute("SELECT pg_try_advisory_lock(%s)", (lock_key,))
+            if cr.fetchone()[0]:
+                return True
+            # Lecture hors transaction longue: voir l'annonce du détenteur du verrou
+            cr.commit()
+            cr.execute("SELECT date_calcul FROM pos_paie_calcul_cache WHERE cle = %s AND resultat IS NULL", (key,))
+            row = cr.fetchone()
+            if row and row[0] and row[0] < debut:
+                return False
+            if time.monotonic() >= echeance:
+                logging.warning("pos_paie: verrou de calcul %s non obtenu en %ss, calcul direct", key, timeout)
+                return False
+            time.sleep(pause)
+            pause = min(pause * 2, 0.5)
+
+    @api.autovacuum
+    def _gc_expired(self):
+        self.env.cr.execute("DELETE FROM pos_paie_calcul_cache WHERE date_expiration < (now() at time zone 'UTC')")
+        logging.info("pos_paie: %s résultats de calcul expirés supprimés", self.env.cr.rowcount)
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""Banc de charge HTTP pour les routes /api/pos_paie/* (PosPaieApi).
+
+Autonome (bibliothèque standard uniquement). Le script:
+
+1. peuple la base cible avec des vendeurs et des commandes synthétiques
+   (via /jsonrpc, service object/execute_kw);
+2. rejoue un mélange pondéré d'appels ``vendeurs``, ``calculer``, ``rapport``,
+   ``periode/create``, ``periodes`` et ``payer_commandes`` à la concurrence
+   demandée, avec une session authentifiée (/web/session/authenticate);
+3. écrit un rapport JSON par route: débit, latences p50/p95/p99, taux d'erreur.
+
+Exemple::
+
+    python scripts/pos_paie_loadtest.py --url http://localhost:8069 --db paie_bench \\
+        --login admin --password admin --vendeurs 200 --commandes 20000 \\
+        --concurrency 16 --duration 60 --output baseline.json
+
+Les champs obligatoires propres à une installation de pos_caisse peuvent être
+ajoutés aux commandes générées avec ``--commande-vals '{"caisse_id": 1}'``.
+À n'utiliser que sur une base de test: ``payer_commandes`` marque des
+commandes synthétiques comme payées et ``periode/create`` crée des périodes.
+Le peuplement est idempotent: seules les commandes manquantes pour atteindre
+``--commandes`` commandes ``LT*`` non payées sur la période sont créées. En fin
+de run, les commandes payées sont remises à « non payée » et les périodes
+créées supprimées (sauf ``--keep``), pour que deux runs successifs aux mêmes
+options mesurent la même charge.
+
+Limite: ``periode/create`` crée des périodes d'un jour en 2100, sans
+commandes (pour ne pas chevaucher les périodes réelles): sa latence mesure la
+création et un recalcul à vide, pas la clôture d'une période chargée.
+"""
+import argparse
+import itertools
+import json
+import math
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+DEFAULT_MIX = 'vendeurs=4,calculer=3,rapport=3,periode/create=1,periodes=2,payer_commandes=1'
+CARD_PREFIX = 'LT'
+
+
+class Client(object):
+    """Client JSON-RPC minimal (une connexion urllib par appel)."""
+
+    def __init__(self, url, timeout):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.session_id = None
+        self._ids = itertools.count(1)
+
+    def post(self, path, params):
+        body = json.dumps({'jsonrpc': '2.0', 'method': 'call', 'id': next(self._ids), 'params': params}).encode()
+        req = urllib.request.Request(self.url + path, data=body, headers={'Content-Type': 'application/json'})
+        if self.session_id:
+            req.add_header('Cookie', 'session_id=%s' % self.session_id)
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            for header in resp.headers.get_all('Set-Cookie') or []:
+                if header.startswith('session_id='):
+                    self.session_id = header.split(';', 1)[0].split('=', 1)[1]
+            payload = json.loads(resp.read().decode())
+        if payload.get('error'):
+            raise RuntimeError(payload['error'].get('data', {}).get('message') or payload['error'].get('message'))
+        return payload.get('result')
+
+    def authenticate(self, db, login, password):
+        self.session_id = None
+        self.post('/web/session/authenticate', {'db': db, 'login': login, 'password': password})
+        if not self.session_id:
+            raise RuntimeError('authentification refusée pour %s' % login)
+
+    def execute_kw(self, db, uid, password, model, method, args, kwargs=None):
+        return self.post('/jsonrpc', {
+            'service': 'object', 'method': 'execute_kw',
+            'args': [db, uid, password, model, method, args, kwargs or {}],
+        })
+
+
+def login(client, opts):
+    uid = client.post('/jsonrpc', {'service': 'common', 'method': 'login', 'args': [opts.db, opts.login, opts.password]})
+    if not uid:
+        raise RuntimeError('login XML/JSON-RPC refusé')
+    return uid
+
+
+def seed(client, uid, opts):
+    """Crée les vendeurs/commandes synthétiques; retourne (cartes, ids de commandes)."""
+    rnd = random.Random(opts.seed)
+    cards = ['%s%06d' % (CARD_PREFIX, i) for i in range(opts.vendeurs)]
+    existing = client.execute_kw(opts.db, uid, opts.password, 'pos.caisse.vendeur', 'search_read',
+                                 [[('carte_numero', 'in', cards)]], {'fields': ['carte_numero']})
+    known = {r['carte_numero'] for r in existing}
+    vendor_vals = [{
+        'name': 'Vendeur charge %s' % card,
+        'carte_numero': card,
+        'pourcentage_commission': rnd.choice([20.0, 25.0, 30.0]),
+    } for card in cards if card not in known]
+    for chunk in _chunks(vendor_vals, 500):
+        client.execute_kw(opts.db, uid, opts.password, 'pos.caisse.vendeur', 'create', [chunk])
+
+    start = opts.date_debut
+    span = max((opts.date_fin - opts.date_debut).days, 0) + 1
+    # Idempotent: on ne crée que les commandes manquantes sur la période
+    domain = _domain_commandes(opts)
+    existing = client.execute_kw(opts.db, uid, opts.password, 'pos.caisse.commande', 'search_count', [domain])
+    extra = json.loads(opts.commande_vals) if opts.commande_vals else {}
+    vals_list = []
+    for _ in range(max(opts.commandes - existing, 0)):
+        day = start + timedelta(days=rnd.randrange(span))
+        moment = datetime.combine(day, datetime.min.time()) + timedelta(seconds=rnd.randrange(86400))
+        vals = dict(extra, **{
+            'client_card': rnd.choice(cards),
+            'total': float(rnd.randrange(1000, 50000, 500)),
+            'type_paiement': 'bp' if rnd.random() < 0.3 else 'cash',
+            'date': moment.strftime('%Y-%m-%d %H:%M:%S'),
+            'paiement_state': 'non_payee',
+        })
+        vals_list.append(vals)
+        if len(vals_list) >= 500:
+            client.execute_kw(opts.db, uid, opts.password, 'pos.caisse.commande', 'create', [vals_list])
+            vals_list = []
+    if vals_list:
+        client.execute_kw(opts.db, uid, opts.password, 'pos.caisse.commande', 'create', [vals_list])
+    commande_ids = client.execute_kw(opts.db, uid, opts.password, 'pos.caisse.commande', 'search', [domain])
+    return cards, commande_ids
+
+
+def _domain_commandes(opts):
+    """Commandes synthétiques non payées de la période de charge."""
+    return [
+        ('client_card', '=like', CARD_PREFIX + '%'),
+        ('state', '!=', 'annule'),
+        ('paiement_state', '=', 'non_payee'),
+        ('date', '>=', opts.date_debut.isoformat() + ' 00:00:00'),
+        ('date', '<=', opts.date_fin.isoformat() + ' 23:59:59'),
+    ]
+
+
+def existing_data(client, uid, opts):
+    """Cartes et commandes non payées déjà peuplées (``--no-seed``)."""
+    vendeurs = client.execute_kw(opts.db, uid, opts.password, 'pos.caisse.vendeur', 'search_read',
+                                 [[('carte_numero', '=like', CARD_PREFIX + '%')]], {'fields': ['carte_numero']})
+    cards = sorted(r['carte_numero'] for r in vendeurs)
+    commande_ids = client.execute_kw(opts.db, uid, opts.password, 'pos.caisse.commande', 'search',
+                                     [_domain_commandes(opts)])
+    return cards, commande_ids
+
+
+def periode_base(client, uid, opts):
+    """Premier jour libre après les périodes de charge existantes (à partir du 2100-01-01)."""
+    base = date(2100, 1, 1)
+    last = client.execute_kw(opts.db, uid, opts.password, 'pos.paie.periode', 'search_read',
+                             [[('date_fin', '>=', base.isoformat())]],
+                             {'fields': ['date_fin'], 'order': 'date_fin desc', 'limit': 1})
+    if last:
+        base = max(base, date.fromisoformat(last[0]['date_fin']) + timedelta(days=1))
+    return base
+
+
+def cleanup(client, uid, opts, scenario):
+    """Remet les commandes payées à « non payée » et supprime les périodes du run."""
+    for chunk in _chunks(scenario.commande_ids_payees, 500):
+        client.execute_kw(opts.db, uid, opts.password, 'pos.caisse.commande', 'write',
+                          [chunk, {'paiement_state': 'non_payee'}])
+    periode_ids = client.execute_kw(opts.db, uid, opts.password, 'pos.paie.periode', 'search',
+                                    [[('name', '=like', scenario.periode_prefix + '%')]])
+    for chunk in _chunks(periode_ids, 500):
+        client.execute_kw(opts.db, uid, opts.password, 'pos.paie.periode', 'unlink', [chunk])
+    return len(periode_ids)
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class Scenario(object):
+    """Construit les paramètres de chaque route à partir des données peuplées."""
+
+    def __init__(self, opts, cards, commande_ids, periode_base):
+        self.opts = opts
+        self.cards = cards or ['%s%06d' % (CARD_PREFIX, 0)]
+        self.commande_ids = list(commande_ids)
+        self.commande_ids_payees = []
+        self.rnd = random.Random(opts.seed + 1)
+        self.lock = threading.Lock()
+        # Périodes créées sur des jours distincts, après celles des runs précédents, pour ne pas se chevaucher
+        self.periode_days = itertools.count()
+        self.periode_base = periode_base
+        self.periode_prefix = 'Charge %x ' % int(time.time())
+
+    def period(self):
+        return {'date_debut': self.opts.date_debut.isoformat(), 'date_fin': self.opts.date_fin.isoformat()}
+
+    def params(self, route):
+        with self.lock:
+            card = self.rnd.choice(self.cards)
+            if route == 'vendeurs':
+                return dict(self.period(), with_totaux=True, pourcentage=0.25)
+            if route in ('calculer', 'rapport'):
+                return dict(self.period(), vendeur_card=card, pourcentage=0.25)
+            if route == 'periode/create':
+                day = self.periode_base + timedelta(days=next(self.periode_days))
+                return {'date_debut': day.isoformat(), 'date_fin': day.isoformat(), 'name': '%s%s' % (self.periode_prefix, day)}
+            if route == 'periodes':
+                return {'limit': 20, 'offset': 0}
+            if route == 'payer_commandes':
+                # Plus de commandes non payées: la route est sautée (None)
+                batch = [self.commande_ids.pop() for _ in range(min(5, len(self.commande_ids)))]
+                self.commande_ids_payees += batch
+                return {'commande_ids': batch} if batch else None
+        raise ValueError(route)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    # Rang le plus proche (nearest-rank)
+    rank = max(int(math.ceil(pct / 100.0 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def run(opts):
+    mix = parse_mix(opts.mix)
+    routes, weights = zip(*mix.items())
+
+    setup = Client(opts.url, opts.timeout)
+    uid = login(setup, opts)
+    if opts.seed_data:
+        cards, commande_ids = seed(setup, uid, opts)
+    else:
+        cards, commande_ids = existing_data(setup, uid, opts)
+    if 'payer_commandes' in mix and not commande_ids:
+        print('aucune commande non payée: payer_commandes retiré du mélange', file=sys.stderr)
+        del mix['payer_commandes']
+        routes, weights = zip(*mix.items())
+    scenario = Scenario(opts, cards, commande_ids, periode_base(setup, uid, opts))
+    setup.authenticate(opts.db, opts.login, opts.password)
+
+    samples = {route: [] for route in routes}
+    errors = {route: 0 for route in routes}
+    lock = threading.Lock()
+    deadline = time.monotonic() + opts.duration
+    remaining = itertools.count()
+    rnd = random.Random(opts.seed + 2)
+
+    def worker():
+        client = Client(opts.url, opts.timeout)
+        client.session_id = setup.session_id
+        while time.monotonic() < deadline:
+            if opts.requests and next(remaining) >= opts.requests:
+                return
+            with lock:
+                route = rnd.choices(routes, weights)[0]
+            params = scenario.params(route)
+            if params is None:
+                continue
+            started = time.perf_counter()
+            ok = True
+            try:
+                res = client.post('/api/pos_paie/%s' % route, params)
+                ok = not (isinstance(res, dict) and res.get('status') == 'error')
+            except (urllib.error.URLError, RuntimeError, OSError, ValueError):
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000.0
+            with lock:
+                samples[route].append(elapsed)
+                if not ok:
+                    errors[route] += 1
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=opts.concurrency) as pool:
+        for _ in range(opts.concurrency):
+            pool.submit(worker)
+    wall = time.monotonic() - started
+    periodes_supprimees = None
+    if not opts.keep:
+        periodes_supprimees = cleanup(setup, uid, opts, scenario)
+    return report(opts, mix, samples, errors, wall, scenario, periodes_supprimees)
+
+
+def report(opts, mix, samples, errors, wall, scenario, periodes_supprimees):
+    def stats(values, nb_errors):
+        values = sorted(values)
+        count = len(values)
+        return {
+            'count': count,
+            'errors': nb_errors,
+            'error_rate': round(nb_errors / count, 4) if count else 0.0,
+            'throughput_rps': round(count / wall, 2) if wall else 0.0,
+            'mean_ms': round(sum(values) / count, 2) if count else None,
+            'p50_ms': _round(percentile(values, 50)),
+            'p95_ms': _round(percentile(values, 95)),
+            'p99_ms': _round(percentile(values, 99)),
+            'max_ms': _round(values[-1] if values else None),
+        }
+
+    all_values = [v for values in samples.values() for v in values]
+    return {
+        'config': {
+            'url': opts.url,
+            'db': opts.db,
+            'concurrency': opts.concurrency,
+            'duration_s': opts.duration,
+            'requests': opts.requests,
+            'mix': ','.join('%s=%g' % item for item in mix.items()),
+            'vendeurs': opts.vendeurs,
+            'commandes': opts.commandes,
+            'periode': [opts.date_debut.isoformat(), opts.date_fin.isoformat()],
+            'seed': opts.seed,
+            'seed_data': opts.seed_data,
+            # payer_commandes modifie la charge: commandes remises à « non payée » sauf --keep
+            'commandes_payees': len(scenario.commande_ids_payees),
+            'etat_restaure': not opts.keep,
+            'periodes_supprimees': periodes_supprimees,
+            'commandes_periode': len(scenario.commande_ids) + len(scenario.commande_ids_payees),
+            # Limite connue: périodes d'un jour en 2100 sans commandes (création + recalcul à vide)
+            'periode_create': 'periode_vide_2100',
+        },
+        'wall_s': round(wall, 3),
+        'routes': {route: stats(values, errors[route]) for route, values in samples.items()},
+        'total': stats(all_values, sum(errors.values())),
+    }
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(','):
+        route, _, weight = part.strip().partition('=')
+        if route:
+            mix[route] = float(weight or 1)
+    unknown = set(mix) - {'vendeurs', 'calculer', 'rapport', 'periode/create', 'periodes', 'payer_commandes'}
+    if unknown:
+        raise SystemExit('routes inconnues dans --mix: %s' % ', '.join(sorted(unknown)))
+    return mix
+
+
+def parse_args(argv):
+    today = date.today()
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', default='http://localhost:8069')
+    parser.add_argument('--db', required=True)
+    parser.add_argument('--login', default='admin')
+    parser.add_argument('--password', default='admin')
+    parser.add_argument('--vendeurs', type=int, default=100, help='vendeurs synthétiques')
+    parser.add_argument('--commandes', type=int, default=10000, help='commandes synthétiques')
+    parser.add_argument('--no-seed', dest='seed_data', action='store_false', help='réutiliser les données déjà peuplées')
+    parser.add_argument('--keep', action='store_true',
+                        help='garder les commandes payées et les périodes créées pendant le run')
+    parser.add_argument('--commande-vals', help='valeurs JSON ajoutées à chaque commande générée')
+    parser.add_argument('--date-debut', type=date.fromisoformat, default=today.replace(day=1))
+    parser.add_argument('--date-fin', type=date.fromisoformat, default=today)
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='poids par route, ex. "%s"' % DEFAULT_MIX)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30.0, help='durée maximale en secondes')
+    parser.add_argument('--requests', type=int, default=0, help='nombre total de requêtes (0 = limité par --duration)')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='fichier JSON de sortie (stdout par défaut)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    opts = parse_args(argv)
+    result = json.dumps(run(opts), indent=2, sort_keys=True)
+    if opts.output:
+        with open(opts.output, 'w') as f:
+            f.write(result + '\n')
+    else:
+        print(result)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,140 @@
+# Copyright 2025
+"""Backfill par lots, reprenable, pour les migrations pos_paie.
+
+Remplir une colonne stockée de ``pos.paie.periode.ligne`` ou ``pos.paie.vendeur``
+en une seule requête verrouille la table pendant toute la mise à jour du
+module. Les fonctions ci-dessous parcourent la table par ``id`` croissant, par
+lots de ``chunk_size`` lignes, committent après chaque lot et mémorisent le
+dernier ``id`` traité dans la table ``pos_paie_backfill``: une mise à jour
+interrompue reprend là où elle s'était arrêtée au prochain ``-u pos_paie``.
+
+Exemple (``migrations/<version>/post-migrate.py``, si ``vendeur_card`` devenait
+une colonne stockée)::
+
+    from odoo.addons.pos_paie.tools.backfill import backfill
+
+    def migrate(cr, version):
+        backfill(
+            cr, 'ligne_vendeur_card', 'pos_paie_periode_ligne',
+            "vendeur_card = v.carte_numero FROM pos_caisse_vendeur v",
+            where="vendeur_card IS NULL",
+            join_where="v.id = {table}.vendeur_id",
+        )
+"""
+import logging
+import time
+
+from psycopg2 import sql
+
+STATE_TABLE = 'pos_paie_backfill'
+
+
+def _ensure_state_table(cr):
+    cr.execute(f"""
+        CREATE TABLE IF NOT EXISTS {STATE_TABLE} (
+            name varchar PRIMARY KEY,
+            last_id integer NOT NULL DEFAULT 0,
+            done boolean NOT NULL DEFAULT false,
+            write_date timestamp without time zone DEFAULT (now() at time zone 'UTC')
+        )
+    """)
+
+
+def _load_state(cr, name):
+    cr.execute(f"SELECT last_id, done FROM {STATE_TABLE} WHERE name = %s", (name,))
+    row = cr.fetchone()
+    return (row[0], row[1]) if row else (0, False)
+
+
+def _save_state(cr, name, last_id, done=False):
+    cr.execute(f"""
+        INSERT INTO {STATE_TABLE} (name, last_id, done) VALUES (%s, %s, %s)
+        ON CONFLICT (name) DO UPDATE
+        SET last_id = EXCLUDED.last_id, done = EXCLUDED.done, write_date = (now() at time zone 'UTC')
+    """, (name, last_id, done))
+
+
+def reset(cr, name):
+    """Oublie le curseur de ``name`` (le prochain backfill repart du début)."""
+    _ensure_state_table(cr)
+    cr.execute(f"DELETE FROM {STATE_TABLE} WHERE name = %s", (name,))
+
+
+def iter_chunks(cr, name, table, where='TRUE', params=(), chunk_size=5000, commit=True, lock_timeout='5s'):
+    """Itère sur les ids de ``table`` par lots croissants, en persistant le curseur.
+
+    Chaque lot est produit à l'appelant, qui le traite; le curseur est ensuite
+    avancé et la transaction committée (si ``commit``). Rien n'est produit si
+    le backfill ``name`` est déjà terminé.
+    """
+    _ensure_state_table(cr)
+    last_id, done = _load_state(cr, name)
+    if done:
+        logging.info("backfill %s: déjà terminé", name)
+        return
+    if commit:
+        cr.commit()
+    query = sql.SQL("SELECT id FROM {table} WHERE id > %s AND ({where}) ORDER BY id LIMIT %s").format(
+        table=sql.Identifier(table), where=sql.SQL(where),
+    )
+    started = time.time()
+    nb = 0
+    while True:
+        if lock_timeout:
+            # Un lot qui attend un verrou échoue vite au lieu de bloquer la base; relancer reprend au curseur
+            cr.execute("SET LOCAL lock_timeout = %s", (lock_timeout,))
+        cr.execute(query, (last_id,) + tuple(params) + (chunk_size,))
+        ids = [row[0] for row in cr.fetchall()]
+        if not ids:
+            break
+        yield ids
+        last_id = ids[-1]
+        nb += len(ids)
+        _save_state(cr, name, last_id)
+        if commit:
+            cr.commit()
+        logging.info("backfill %s: %s lignes (id <= %s) en %.1fs", name, nb, last_id, time.time() - started)
+    _save_state(cr, name, last_id, done=True)
+    if commit:
+        cr.commit()
+
+
+def backfill(cr, name, table, set_clause, where='TRUE', params=(), set_params=(), join_where=None,
+             chunk_size=5000, commit=True, lock_timeout='5s'):
+    """``UPDATE table SET <set_clause> WHERE id IN <lot>`` par lots, reprenable.
+
+    - ``where``/``params``: filtre des lignes à traiter (ex. ``"col IS NULL"``);
+    - ``set_clause``/``set_params``: partie SET, éventuellement suivie d'un
+      ``FROM`` (les conditions de jointure vont dans ``join_where``, où
+      ``{table}`` désigne la table mise à jour).
+
+    Retourne le nombre de lignes mises à jour lors de cet appel.
+    """
+    conditions = sql.SQL("{table}.id = ANY(%s)").format(table=sql.Identifier(table))
+    if join_where:
+        conditions = sql.SQL("{} AND ({})").format(conditions, sql.SQL(join_where.format(table=table)))
+    update = sql.SQL("UPDATE {table} SET {set_clause} WHERE {conditions}").format(
+        table=sql.Identifier(table), set_clause=sql.SQL(set_clause), conditions=conditions,
+    )
+    total = 0
+    for ids in iter_chunks(cr, name, table, where=where, params=params, chunk_size=chunk_size,
+                           commit=commit, lock_timeout=lock_timeout):
+        cr.execute(update, tuple(set_params) + (ids,))
+        total += cr.rowcount
+    return total
+
+
+def recompute_fields(env, name, model_name, fnames, where='TRUE', params=(), chunk_size=1000, commit=True):
+    """Recalcule par lots des champs calculés stockés de ``model_name``, reprenable."""
+    Model = env[model_name].with_context(active_test=False)
+    fields_to_compute = [Model._fields[fname] for fname in fnames]
+    total = 0
+    for ids in iter_chunks(env.cr, name, Model._table, where=where, params=params,
+                           chunk_size=chunk_size, commit=commit):
+        records = Model.browse(ids)
+        for field in fields_to_compute:
+            env.add_to_compute(field, records)
+        records.flush(fnames, records)
+        env.clear()
+        total += len(ids)
+    return total
@@ -0,0 +1,29 @@
+# Copyright 2025
+"""Noyau de calcul commission / net partagé par tous les chemins de paie."""
+import numpy as np
+
+
+def calculer_commissions(totaux, totaux_bp, taux, frais_carte=0.0):
+    """Commission et montant net d'un lot de cartes, en un seul appel vectorisé.
+
+    ``totaux`` et ``totaux_bp`` sont des séquences de même longueur (une valeur
+    par carte); ``taux`` (fraction décimale, 0.25 == 25 %) et ``frais_carte``
+    sont un scalaire ou une séquence de même longueur.
+
+        commission = total * taux
+        net = commission - total_bp - frais_carte
+
+    Utilisé par la ligne de période, la paie vendeur, l'assistant et les
+    routes API, avec ``frais_carte`` (pos_paie.frais_carte) pour chaque carte
+    ayant des commandes. Seule la route legacy /api/pos_paie/totaux passe
+    ``frais_carte=0`` pour garder ses montants historiques.
+
+    Retourne ``(commissions, nets)`` en ``numpy.ndarray`` de float64.
+    """
+    totaux = np.asarray(totaux, dtype=np.float64)
+    totaux_bp = np.asarray(totaux_bp, dtype=np.float64)
+    taux = np.asarray(taux, dtype=np.float64)
+    frais_carte = np.asarray(frais_carte, dtype=np.float64)
+    commissions = totaux * taux
+    nets = commissions - totaux_bp - frais_carte
+    return commissions, nets